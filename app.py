@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response
 from models import db, FeaturedProduct
 from omnidimension import Client
 from dotenv import load_dotenv
@@ -9,17 +9,23 @@ from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 import requests
 from bs4 import BeautifulSoup
 import re
+import math
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import aiohttp
 import asyncio
 import httpx
-from geopy.distance import geodesic
 import json
+from config import PRICE_HISTORY_CONFIG, SERVICE_URLS, SERVING_CONFIG, STORE_LOCATOR_CONFIG
+from matching import compare_prices, group_results
+from circuit_breaker import scraper_breakers, NoProductCards
+from selector_health import selector_health, any_selector_present, first_price_text, shows_no_results
+from profiling import profile_request, stage, span, bind
+from store_locator import CachedStoreIndex, parse_points, bulk_nearby_stores, stream_bulk_nearby
+from price_history import init_price_history, record_prices, get_price_trend, get_pharmacy_ranking, parse_days
 
 # Load environment variables
 load_dotenv()
@@ -44,6 +50,9 @@ db.init_app(app)
 with app.app_context():
     db.create_all()
 
+# Create price history rollups
+init_price_history()
+
 # Function to seed initial featured products
 def seed_featured_products():
     with app.app_context():
@@ -76,13 +85,18 @@ def seed_featured_products():
 
 # Update PHARMACIES dictionary first
 PHARMACIES = {
-    "Apollo": "https://www.apollopharmacy.in/search-medicines/{}",
-    "1mg": "https://www.1mg.com/search/all?name={}",
-    "PharmEasy": "https://pharmeasy.in/search/all?name={}",
-    "TrueMeds": "https://www.truemeds.in/search/{}",
+    "Apollo": SERVICE_URLS["Apollo"] + "/search-medicines/{}",
+    "1mg": SERVICE_URLS["1mg"] + "/search/all?name={}",
+    "PharmEasy": SERVICE_URLS["PharmEasy"] + "/search/all?name={}",
+    "TrueMeds": SERVICE_URLS["TrueMeds"] + "/search/{}",
 }
 
+@stage("chrome_startup")
+def start_chrome(options):
+    return webdriver.Chrome(options=options)
+
 # Replace Netmeds scraper with Apollo scraper
+@stage("scrape_apollo_selenium")
 def scrape_apollo_selenium(medicine):
     print("[Apollo] Scraping...")
     options = Options() 
@@ -93,25 +107,28 @@ def scrape_apollo_selenium(medicine):
     options.add_experimental_option('excludeSwitches', ['enable-automation'])
     options.add_experimental_option('useAutomationExtension', False)
 
-    driver = webdriver.Chrome(options=options)
+    driver = start_chrome(options)
     results = []
 
     try:
         # Direct search without homepage visit
-        search_url = f"https://www.apollopharmacy.in/search-medicines/{medicine.replace(' ', '-')}"
+        search_url = PHARMACIES["Apollo"].format(medicine.replace(' ', '-'))
         driver.get(search_url)
         time.sleep(5)
 
-        # Wait for product cards with specific selector
-        wait = WebDriverWait(driver, 15)
+        # Wait for product cards; selectors are kept in selector_health like the other scrapers
+        selectors = selector_health.ordered("Apollo", "card", ["div[class*='ProductCard_productCardGrid']"])
+        # Price selectors stay in priority order; only card selectors are remembered
+        price_selectors = ["span.zL_", "p.oR.hR"]
         try:
-            cards = wait.until(EC.presence_of_all_elements_located((
-                By.CSS_SELECTOR, "div[class*='ProductCard_productCardGrid']"
-            )))
-            print(f"[Apollo] Found {len(cards)} products")
+            card_selector, cards = WebDriverWait(driver, 15).until(any_selector_present(selectors, "Apollo"))
         except Exception as e:
-            print(f"[Apollo] Failed to find products: {e}")
+            raise NoProductCards(f"[Apollo] Failed to find products: {e}") from e
+        if card_selector is None:
+            print("[Apollo] No results for this search")
             return results
+        print(f"[Apollo] Found {len(cards)} products")
+        selector_health.remember("Apollo", "card", card_selector)
 
         for card in cards[:5]:
             try:
@@ -122,14 +139,9 @@ def scrape_apollo_selenium(medicine):
                 link_elem = card.find_element(By.CSS_SELECTOR, "a[href*='/otc/']")
                 link = link_elem.get_attribute("href")
 
-                # Get price using specific selector
-                try:
-                    price_elem = card.find_element(By.CSS_SELECTOR, "span.zL_")
-                    price_text = price_elem.text.strip()
-                    if not price_text:
-                        price_elem = card.find_element(By.CSS_SELECTOR, "p.oR.hR")
-                        price_text = price_elem.text.strip()
-                except:
+                # Get price from the first selector that has one
+                _, price_text = first_price_text(card, price_selectors)
+                if not price_text:
                     continue
 
                 # Clean price text
@@ -151,8 +163,10 @@ def scrape_apollo_selenium(medicine):
                 print(f"[Apollo] Card error: {str(e)}")
                 continue
 
+
     except Exception as e:
         print(f"[Apollo] Error: {str(e)}")
+        raise
     finally:
         driver.quit()
 
@@ -161,7 +175,29 @@ def scrape_apollo_selenium(medicine):
 def clean_price(price_str):
     return float(price_str.replace("₹", "").replace(",", "").strip())
 
+# Reads every 1mg card in a single execute_script call instead of one WebDriver call per field
+EXTRACT_1MG_CARDS_JS = """
+const [cardSelector, priceSelectors, limit] = arguments;
+return Array.from(document.querySelectorAll(cardSelector)).slice(0, limit).map(card => {
+    const link = card.querySelector('a');
+    let priceText = null;
+    for (const selector of priceSelectors) {
+        const el = card.querySelector(selector);
+        if (el && /\\d/.test(el.textContent)) {
+            priceText = el.textContent.trim();
+            break;
+        }
+    }
+    return {
+        name: link ? (link.getAttribute('title') || link.textContent.trim()) : null,
+        link: link ? link.href : null,
+        priceText: priceText
+    };
+});
+"""
+
 # 🟢 1mg Scraper (Selenium)
+@stage("scrape_1mg_selenium")
 def scrape_1mg_selenium(medicine):
     print("[1mg] Scraping...")
     options = Options()
@@ -171,16 +207,16 @@ def scrape_1mg_selenium(medicine):
     options.add_argument('--window-size=1920,1080')
     options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
     
-    driver = webdriver.Chrome(options=options)
+    driver = start_chrome(options)
     results = []
     
     try:
         # First load the main page
-        driver.get("https://www.1mg.com")
+        driver.get(SERVICE_URLS["1mg"])
         time.sleep(2)
         
         # Then perform the search
-        search_url = f"https://www.1mg.com/search/all?name={medicine.replace(' ', '+')}"
+        search_url = PHARMACIES["1mg"].format(medicine.replace(' ', '+'))
         driver.get(search_url)
         time.sleep(3)
         
@@ -188,76 +224,61 @@ def scrape_1mg_selenium(medicine):
         driver.execute_script("window.scrollBy(0, 300);")
         time.sleep(2)
         
-        # Wait for any of these selectors to be present
-        selectors = [
+        # Wait once for whichever card selector appears first, trying the last one that worked first
+        selectors = selector_health.ordered("1mg", "card", [
             "div.style_horizontal-card___1Zwmt",
             "div[class*='horizontal-card']",
             "div.style__horizontal-card___1Zwmt"
+        ])
+        # Price selectors stay in priority order (selling price before MRP)
+        price_selectors = [
+            "span[class*='price']",
+            "span[class*='mrp']",
+            "div[class*='price']"
         ]
-        
-        cards = None
-        wait = WebDriverWait(driver, 15)
-        for selector in selectors:
-            try:
-                cards = wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, selector)))
-                if cards:
-                    print(f"[1mg] Found cards with selector: {selector}")
-                    break
-            except:
-                continue
-        
-        if not cards:
-            print("[1mg] No product cards found")
+
+        try:
+            card_selector, _ = WebDriverWait(driver, 15).until(any_selector_present(selectors, "1mg"))
+        except Exception as e:
+            raise NoProductCards("[1mg] No product cards found") from e
+        if card_selector is None:
+            print("[1mg] No results for this search")
             return results
-            
-        for card in cards[:5]:
+        print(f"[1mg] Found cards with selector: {card_selector}")
+        selector_health.remember("1mg", "card", card_selector)
+
+        # Extract name, link and price for all cards in one round-trip
+        cards = driver.execute_script(EXTRACT_1MG_CARDS_JS, card_selector, price_selectors, 5)
+
+        for card in cards:
             try:
-                # Get name and link
-                link_elem = card.find_element(By.TAG_NAME, "a")
-                name = link_elem.get_attribute("title") or link_elem.text.strip()
-                link = link_elem.get_attribute("href")
-                
-                # Try multiple price selectors
-                price = "0"
-                price_selectors = [
-                    "span[class*='price']",
-                    "span[class*='mrp']",
-                    "div[class*='price']"
-                ]
-                
-                for price_selector in price_selectors:
-                    try:
-                        price_elem = card.find_element(By.CSS_SELECTOR, price_selector)
-                        price_text = price_elem.text.strip()
-                        # Extract numbers from price text
-                        price_match = re.search(r'[\d,]+', price_text)
-                        if price_match:
-                            price = price_match.group()
-                            break
-                    except:
-                        continue
+                if not card['name'] or not card['priceText']:
+                    continue
+                price = re.search(r'[\d,]+(?:\.\d+)?', card['priceText']).group()
 
                 delivery = 25
                 results.append({
-                    "name": name,
+                    "name": card['name'],
                     "price": clean_price(price),
                     "pharmacy": "1mg",
                     "delivery": delivery,
                     "final_price": clean_price(price) + delivery,
-                    "link": link
+                    "link": card['link']
                 })
-                print(f"[1mg] Found product: {name} at ₹{price}")
+                print(f"[1mg] Found product: {card['name']} at ₹{price}")
             except Exception as e:
                 print(f"[1mg] Card error: {e}")
                 
     except Exception as e:
         print(f"[1mg] Error: {e}")
+        raise
     finally:
         driver.quit()
         
     return results
 
 # 🔵 PharmEasy Scraper (Selenium)
+@stage("scrape_pharmeasy_selenium")
 def scrape_pharmeasy_selenium(medicine):
     options = Options()
     options.add_argument('--headless')
@@ -265,27 +286,36 @@ def scrape_pharmeasy_selenium(medicine):
     options.add_argument('--disable-dev-shm-usage')
     options.add_argument("user-agent=Mozilla/5.0")
 
-    driver = webdriver.Chrome(options=options)
+    driver = start_chrome(options)
     results = []
 
     try:
         url = PHARMACIES["PharmEasy"].format(medicine.replace(" ", "%20"))
         driver.get(url)
 
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, 'div.ProductCard_medicineUnitContainer__m2_zO'))
-        )
+        selectors = selector_health.ordered("PharmEasy", "card", [
+            "div.ProductCard_medicineUnitContainer__m2_zO",
+            "div[class*='ProductCard_medicineUnitContainer']"
+        ])
+        # "span" is the fallback if the price class changes; it must never be tried first
+        price_selectors = ["div.ProductCard_mrp__ibLhX", "span"]
+        try:
+            card_selector, _ = WebDriverWait(driver, 10).until(any_selector_present(selectors, "PharmEasy"))
+        except Exception as e:
+            raise NoProductCards("PharmEasy: no product cards found") from e
+        if card_selector is None:
+            print("PharmEasy: no results for this search")
+            return results
+        selector_health.remember("PharmEasy", "card", card_selector)
         time.sleep(2)
 
-        cards = driver.find_elements(By.CSS_SELECTOR, "div.ProductCard_medicineUnitContainer__m2_zO")
+        cards = driver.find_elements(By.CSS_SELECTOR, card_selector)
         for card in cards[:5]:
             try:
                 name = card.find_element(By.CSS_SELECTOR, "a.ProductCard_defaultWrapper__h4yf3").text.strip()
-                # Corrected selector below
-                try:
-                    price_text = card.find_element(By.CSS_SELECTOR, "div.ProductCard_mrp__ibLhX").text.strip()
-                except:
-                    price_text = card.find_element(By.CSS_SELECTOR, "span").text.strip()  # fallback if class changes
+                _, price_text = first_price_text(card, price_selectors)
+                if not price_text:
+                    continue
                 price = float(re.sub(r'[^\d.]', '', price_text))
                 link = card.find_element(By.CSS_SELECTOR, "a.ProductCard_defaultWrapper__h4yf3").get_attribute("href")
                 results.append({
@@ -296,14 +326,17 @@ def scrape_pharmeasy_selenium(medicine):
                 })
             except Exception as e:
                 print("⚠️ PharmEasy card error:", e)
+
     except Exception as e:
         print("❌ PharmEasy selenium error:", e)
+        raise
     finally:
         driver.quit()
 
     return results
 
 # TrueMeds Scraper (Selenium)
+@stage("scrape_truemeds_selenium")
 def scrape_truemeds_selenium(medicine):
     print("[TrueMeds] Scraping...")
     options = Options()
@@ -313,7 +346,7 @@ def scrape_truemeds_selenium(medicine):
     options.add_argument('--window-size=1920,1080')
     options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/115.0.0.0 Safari/537.36")
     
-    driver = webdriver.Chrome(options=options)
+    driver = start_chrome(options)
     results = []
 
     try:
@@ -321,16 +354,25 @@ def scrape_truemeds_selenium(medicine):
         driver.get(search_url)
         time.sleep(5)
 
-        # Use the exact class from HTML
-        wait = WebDriverWait(driver, 15)
+        # Exact class from HTML first; styled-components hashes change between deploys
+        selectors = selector_health.ordered("TrueMeds", "card", [
+            "div.sc-a39eeb4f-1.zdA-dE",
+            "div.sc-a39eeb4f-1"
+        ])
+        # Discounted price first, MRP as the fallback; fixed order, never reordered
+        price_selectors = [
+            "span.sc-a39eeb4f-17.iwZSqt",
+            "span.sc-a39eeb4f-20.eVOcGs"
+        ]
         try:
-            cards = wait.until(EC.presence_of_all_elements_located((
-                By.CSS_SELECTOR, "div.sc-a39eeb4f-1.zdA-dE"
-            )))
-            print(f"[TrueMeds] Found {len(cards)} products")
+            card_selector, cards = WebDriverWait(driver, 15).until(any_selector_present(selectors, "TrueMeds"))
         except Exception as e:
-            print(f"[TrueMeds] Failed to find products: {e}")
+            raise NoProductCards(f"[TrueMeds] Failed to find products: {e}") from e
+        if card_selector is None:
+            print("[TrueMeds] No results for this search")
             return results
+        print(f"[TrueMeds] Found {len(cards)} products")
+        selector_health.remember("TrueMeds", "card", card_selector)
 
         for card in cards[:5]:
             try:
@@ -344,16 +386,11 @@ def scrape_truemeds_selenium(medicine):
                 mfg_elem = card.find_element(By.CSS_SELECTOR, "span.sc-a39eeb4f-14.faASZT")
                 data['manufacturer'] = mfg_elem.text.strip()
 
-                # Get actual price - exact class from HTML
-                try:
-                    actual_price_elem = card.find_element(By.CSS_SELECTOR, "span.sc-a39eeb4f-17.iwZSqt")
-                    price_text = actual_price_elem.text.replace('₹', '').strip()
-                    data['price'] = float(price_text)
-                except:
-                    # Fallback to MRP if discounted price not found
-                    mrp_elem = card.find_element(By.CSS_SELECTOR, "span.sc-a39eeb4f-20.eVOcGs")
-                    price_text = mrp_elem.text.replace('MRP ₹', '').replace('del', '').strip()
-                    data['price'] = float(re.sub(r'[^\d.]', '', price_text))
+                # Get actual price, or MRP if the discounted price is missing
+                _, price_text = first_price_text(card, price_selectors)
+                if not price_text:
+                    continue
+                data['price'] = float(re.sub(r'[^\d.]', '', price_text))
 
                 # Get product slug from the image URL
                 img_elem = card.find_element(By.CSS_SELECTOR, "img[alt*='Dolo']")
@@ -366,7 +403,7 @@ def scrape_truemeds_selenium(medicine):
                 product_name = data['name'].lower().replace(' ', '-')
                 
                 # Construct the correct OTC URL
-                data['link'] = f"https://www.truemeds.in/otc/{product_name}-{product_id}"
+                data['link'] = f"{SERVICE_URLS['TrueMeds']}/otc/{product_name}-{product_id}"
             
 
                 # Get discount percentage if available
@@ -394,26 +431,34 @@ def scrape_truemeds_selenium(medicine):
                 print("[TrueMeds] Card HTML:", card.get_attribute('outerHTML'))
                 continue
 
+
     except Exception as e:
         print(f"[TrueMeds] Error: {str(e)}")
+        raise
     finally:
         driver.quit()
 
     return results
 
 # Add this async Apollo scraper after your existing scrapers
-async def scrape_apollo_async(medicine):
+@stage("scrape_apollo_async")
+async def scrape_apollo_async(medicine, session=None):
     results = []
     try:
-        url = f"https://www.apollopharmacy.in/search-medicines/{medicine.replace(' ', '-')}"
+        url = PHARMACIES["Apollo"].format(medicine.replace(' ', '-'))
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/115.0.0.0 Safari/537.36'
         }
         
-        html = await fetch_pharmacy_data(url, headers)
-        soup = BeautifulSoup(html, 'html.parser')
+        html = await fetch_pharmacy_data(url, headers, session)
+        with span("parse_html"):
+            soup = BeautifulSoup(html, 'html.parser')
         
         cards = soup.select("div[class*='ProductCard_productCardGrid']")[:5]
+        if not cards:
+            if shows_no_results("Apollo", soup.get_text(" ")):
+                return results
+            raise NoProductCards("[Apollo Async] No product cards found")
         
         for card in cards:
             try:
@@ -422,7 +467,7 @@ async def scrape_apollo_async(medicine):
                 
                 if name and price_elem:
                     price = float(re.sub(r'[^\d.]', '', price_elem.text))
-                    link = "https://www.apollopharmacy.in" + card.select_one("a[href*='/otc/']")['href']
+                    link = SERVICE_URLS["Apollo"] + card.select_one("a[href*='/otc/']")['href']
                     
                     results.append({
                         "name": name,
@@ -438,6 +483,7 @@ async def scrape_apollo_async(medicine):
                 
     except Exception as e:
         print(f"[Apollo Async] Error: {e}")
+        raise
     
     return results
 
@@ -478,25 +524,34 @@ async def parallel_scrape_async(medicine):
 session = httpx.Client(timeout=10.0, limits=httpx.Limits(max_keepalive_connections=5))
 executor = ThreadPoolExecutor(max_workers=4)
 
-async def fetch_pharmacy_data(url, headers):
-    async with aiohttp.ClientSession() as session:
+@stage("fetch")
+async def fetch_pharmacy_data(url, headers, session=None):
+    # Reuse the caller's session (and its connection pool); one-off session otherwise
+    if session is not None:
         async with session.get(url, headers=headers) as response:
             return await response.text()
+    async with aiohttp.ClientSession() as own_session:
+        async with own_session.get(url, headers=headers) as response:
+            return await response.text()
 
-async def scrape_pharmeasy_async(medicine):
+@stage("scrape_pharmeasy_async")
+async def scrape_pharmeasy_async(medicine, session=None):
     results = []
     try:
-        url = f"https://pharmeasy.in/search/all?name={medicine}"
+        url = PHARMACIES["PharmEasy"].format(medicine)
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as response:
-                html = await response.text()
-                
-        soup = BeautifulSoup(html, 'html.parser')
+        html = await fetch_pharmacy_data(url, headers, session)
+
+        with span("parse_html"):
+            soup = BeautifulSoup(html, 'html.parser')
         products = soup.find_all('div', {'class': 'ProductCard_productCard__ergV2'})[:5]
+        if not products:
+            if shows_no_results("PharmEasy", soup.get_text(" ")):
+                return results
+            raise NoProductCards("[PharmEasy Async] No product cards found")
         
         for product in products:
             try:
@@ -513,7 +568,7 @@ async def scrape_pharmeasy_async(medicine):
                         'pharmacy': 'PharmEasy',
                         'delivery': 50.0,
                         'final_price': price_value + 50.0,
-                        'link': f"https://pharmeasy.in{product.find('a')['href']}"
+                        'link': f"{SERVICE_URLS['PharmEasy']}{product.find('a')['href']}"
                     })
                     
             except Exception as e:
@@ -522,6 +577,7 @@ async def scrape_pharmeasy_async(medicine):
                 
     except Exception as e:
         print(f"[PharmEasy Async] Error: {e}")
+        raise
     
     return results
 
@@ -544,84 +600,123 @@ async def parallel_scrape_async(medicine):
     
     return results
 
-def parallel_scrape(medicine):
-    async def run_async():
-        tasks = [
-            scrape_pharmeasy_async(medicine),
-            scrape_apollo_async(medicine)
-        ]
-        results = []
-        
-        # Run async tasks
-        async_results = await asyncio.gather(*tasks, return_exceptions=True)
-        for result in async_results:
-            if isinstance(result, list):  # Only add successful results
-                results.extend(result)
-        
-        # Run selenium tasks in thread pool
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            selenium_tasks = [
-                executor.submit(scrape_1mg_selenium, medicine),
-                executor.submit(scrape_truemeds_selenium, medicine)
-            ]
-            for future in as_completed(selenium_tasks):
-                try:
-                    results.extend(future.result())
-                except Exception as e:
-                    print(f"Selenium scraper error: {e}")
-        
-        return results
+# Bounded pool for blocking Selenium scrapers, shared by all searches so Chrome processes stay capped
+selenium_executor = ThreadPoolExecutor(max_workers=SERVING_CONFIG['SELENIUM_WORKERS'])
+
+@stage("parallel_scrape")
+async def scrape_all(medicine, session):
+    """Run every scraper concurrently on the current event loop, sharing the given HTTP session"""
+    loop = asyncio.get_running_loop()
+
+    # Each pharmacy goes through its circuit breaker so a broken site is skipped
+    tasks = [
+        scraper_breakers.get("PharmEasy").call_async(scrape_pharmeasy_async, medicine, session),
+        scraper_breakers.get("Apollo").call_async(scrape_apollo_async, medicine, session),
+        loop.run_in_executor(selenium_executor, bind(scraper_breakers.get("1mg").call), scrape_1mg_selenium, medicine),
+        loop.run_in_executor(selenium_executor, bind(scraper_breakers.get("TrueMeds").call), scrape_truemeds_selenium, medicine)
+    ]
 
-    # Create new event loop for async operation
+    results = []
+    for result in await asyncio.gather(*tasks, return_exceptions=True):
+        if isinstance(result, list):  # Only add successful results
+            results.extend(result)
+        else:
+            print(f"Scraper error: {result}")
+    return results
+
+async def scrape_with_session(medicine):
+    # A session is bound to its event loop, so each Flask search opens one for all its fetches
+    async with aiohttp.ClientSession() as session:
+        return await scrape_all(medicine, session)
+
+def parallel_scrape(medicine):
+    # Create new event loop for async operation (the Flask views are synchronous)
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     try:
-        results = loop.run_until_complete(run_async())
+        results = loop.run_until_complete(scrape_with_session(medicine))
     finally:
         loop.close()
     
     return results
 
+@stage("render_template")
+def render_index(**context):
+    return render_template('index.html', **context)
+
+def get_featured_products():
+    return FeaturedProduct.query.order_by(
+        FeaturedProduct.created_at.desc()
+    ).limit(4).all()
+
+def render_search_results(medicine, results):
+    return render_index(
+        results=results,
+        search_complete=True,
+        search_attempted=True,  # Pass flag to template
+        no_results=len(results) == 0,
+        medicine_name=medicine,
+        featured_products=get_featured_products(),
+        google_maps_api_key=GOOGLE_MAPS_API_KEY)  # Pass API key to template
+
+def render_home():
+    return render_index(
+        results=[],
+        featured_products=get_featured_products(),
+        search_attempted=False,  # Pass flag to template
+        google_maps_api_key=GOOGLE_MAPS_API_KEY)  # Pass API key to template
+
+def clean_medicine_name(value):
+    """Stripped medicine name from user or agent input, or None if it isn't a usable search term"""
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    return value or None
+
 # 🔷 Flask App Route
 @app.route('/', methods=['GET', 'POST'])
+@profile_request("index")
 def index():
-    results = []
-    featured_products = []
-    search_attempted = False  # Add this flag
-    
     if request.method == 'POST':
-        medicine = request.form.get('medicine')
+        medicine = clean_medicine_name(request.form.get('medicine'))
         quantity = request.form.get('quantity')
-        search_attempted = True  # Set flag when search is attempted
+        if not medicine:
+            return render_home(), 400
         
         print(f"\n🔍 Searching for: {medicine}, Quantity: {quantity}\n")
-        results = parallel_scrape(medicine)
-        results.sort(key=lambda x: x['price'])
-        
-        featured_products = FeaturedProduct.query.order_by(
-            FeaturedProduct.created_at.desc()
-        ).limit(4).all()
-        
-        return render_template('index.html', 
-                             results=results, 
-                             search_complete=True,
-                             search_attempted=search_attempted,  # Pass flag to template
-                             no_results=len(results) == 0,
-                             medicine_name=medicine,
-                             featured_products=featured_products,
-                             google_maps_api_key=GOOGLE_MAPS_API_KEY)  # Pass API key to template
+        results = compare_prices(parallel_scrape(medicine))
+        record_prices(medicine, results)
+        return render_search_results(medicine, results)
     
     # Get featured products for homepage
-    featured_products = FeaturedProduct.query.order_by(
-        FeaturedProduct.created_at.desc()
-    ).limit(4).all()
-    
-    google_maps_api_key = os.getenv('GOOGLE_MAPS_API_KEY')
-    return render_template('index.html', 
-                         results=results,
-                         featured_products=featured_products,
-                         search_attempted=search_attempted,  # Pass flag to template
-                         google_maps_api_key=google_maps_api_key)  # Pass API key to template
+    return render_home()
+
+@app.route('/api/price-trend/<medicine>', methods=['GET'])
+def price_trend(medicine):
+    try:
+        series = get_price_trend(
+            medicine,
+            pharmacy=request.args.get('pharmacy'),
+            days=parse_days(request.args.get('days'), PRICE_HISTORY_CONFIG['TREND_DAYS'])
+        )
+        return jsonify({"success": True, "medicine": medicine, "series": series})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/pharmacy-ranking/<medicine>', methods=['GET'])
+def pharmacy_ranking(medicine):
+    try:
+        ranking = get_pharmacy_ranking(
+            medicine,
+            days=parse_days(request.args.get('days'), PRICE_HISTORY_CONFIG['RANKING_DAYS'])
+        )
+        return jsonify({"success": True, "medicine": medicine, "ranking": ranking})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/scraper-health', methods=['GET'])
+def scraper_health():
+    return jsonify({"success": True, "pharmacies": scraper_breakers.states()})
 
 # Call seed function when app starts
 if __name__ == '__main__':
@@ -661,60 +756,69 @@ def create_medifind_agent():
 # Initialize agent
 agent_id = create_medifind_agent()
 
+def ask_agent(message):
+    with span("omnidimension_chat"):
+        return client.agent.chat(
+            agent_id=agent_id,
+            message=message
+        )
+
+def build_chat_response(response, results):
+    # Extract medicine info if available
+    extracted = response.get('extracted_variables', {})
+    medicine_name = extracted.get('medicine_name')
+    
+    # Add search suggestion
+    search_suggestion = None
+    if medicine_name:
+        search_suggestion = {
+            'medicine': medicine_name,
+            'action': 'search',
+            'message': f'Would you like to compare prices for {medicine_name}?'
+        }
+    print(f"[Chatbot] Extracted medicine: {medicine_name}, Alternatives: {extracted.get('alternative_medicines', [])}")
+    return {
+        "message": response.get('message'),
+        "results": results,
+        "groups": group_results(results),
+        "alternatives": extracted.get('alternative_medicines', []),
+        "search_suggestion": search_suggestion
+    }
+
 # Update the chat endpoint
 @app.route('/chat', methods=['POST'])
+@profile_request("chat")
 def chat():
     if not agent_id:
         return jsonify({"error": "Chatbot not initialized"}), 500
         
     try:
-        message = request.json.get('message')
-        response = client.agent.chat(
-            agent_id=agent_id,
-            message=message
-        )
-        
-        # Extract medicine info if available
-        extracted = response.get('extracted_variables', {})
-        medicine_name = extracted.get('medicine_name')
+        response = ask_agent(request.json.get('message'))
         
         # Get search results if medicine is mentioned
         results = []
-        search_suggestion = None
+        medicine_name = clean_medicine_name(response.get('extracted_variables', {}).get('medicine_name'))
         if medicine_name:
-            results = parallel_scrape(medicine_name)
-            results.sort(key=lambda x: x['price'])
-            
-            # Add search suggestion
-            search_suggestion = {
-                'medicine': medicine_name,
-                'action': 'search',
-                'message': f'Would you like to compare prices for {medicine_name}?'
-            }
-        print(f"[Chatbot] Extracted medicine: {medicine_name}, Alternatives: {extracted.get('alternative_medicines', [])}")
-        return jsonify({
-            "message": response.get('message'),
-            "results": results,
-            "alternatives": extracted.get('alternative_medicines', []),
-            "search_suggestion": search_suggestion
-        })
+            results = compare_prices(parallel_scrape(medicine_name))
+            record_prices(medicine_name, results)
+        return jsonify(build_chat_response(response, results))
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 import requests
-from geopy.distance import geodesic
 from flask import jsonify
 import json
 import os
 
+@stage("fetch_pmbjk_stores")
 def fetch_pmbjk_stores():
     """Fetch Jan Aushadhi Kendras from official API"""
     try:
         # Jan Aushadhi API endpoint
-        url = "https://janaushadhi.gov.in/services/pmbi/store_list.php"
+        url = SERVICE_URLS["JanAushadhi"] + "/services/pmbi/store_list.php"
         
-        response = requests.get(url)
+        response = requests.get(url, timeout=STORE_LOCATOR_CONFIG['FETCH_TIMEOUT'])
         if response.status_code == 200:
             stores = response.json()
             # Process and clean store data
@@ -746,35 +850,20 @@ def fetch_pmbjk_stores():
                 return json.load(f)
     return []
 
+def nearby_stores(user_lat, user_lng):
+    """Return the 5 closest stores within 5km"""
+    # Reuse the cached store index rather than fetching the store list on every request
+    results = next(bulk_nearby_stores([(user_lat, user_lng)], store_index.get(), radius_km=5, k=5))
+    return results[0]['stores']
+
 @app.route('/nearby-stores', methods=['POST'])
+@profile_request("find_nearby_stores")
 def find_nearby_stores():
     try:
         data = request.json
-        user_lat = float(data.get('latitude'))
-        user_lng = float(data.get('longitude'))
-        user_location = (user_lat, user_lng)
-        
-        # Get stores from API or cache
-        all_stores = fetch_pmbjk_stores()
-        
-        # Find stores within 5km radius
-        nearby_stores = []
-        for store in all_stores:
-            if store['lat'] and store['lng']:  # Validate coordinates
-                store_location = (store['lat'], store['lng'])
-                distance = geodesic(user_location, store_location).kilometers
-                
-                if distance <= 5:  # 5km radius
-                    store_data = store.copy()
-                    store_data['distance'] = round(distance, 2)
-                    nearby_stores.append(store_data)
-        
-        # Sort by distance
-        nearby_stores.sort(key=lambda x: x['distance'])
-        
         return jsonify({
             "success": True,
-            "stores": nearby_stores[:5]  # Return 5 closest stores
+            "stores": nearby_stores(float(data.get('latitude')), float(data.get('longitude')))
         })
         
     except Exception as e:
@@ -782,3 +871,36 @@ def find_nearby_stores():
             "success": False,
             "error": str(e)
         }), 500
+
+# Store list is fetched once and reused for bulk lookups until the TTL expires
+store_index = CachedStoreIndex(fetch_pmbjk_stores)
+
+def parse_bulk_request(data):
+    """Return (points, radius_km, k) from a bulk nearby-stores request body"""
+    if not isinstance(data, dict):
+        raise ValueError("request body must be a JSON object")
+    points = parse_points(data.get('points'))
+    radius_km = data.get('radius_km', STORE_LOCATOR_CONFIG['DEFAULT_RADIUS_KM'])
+    if radius_km is not None:
+        radius_km = float(radius_km)
+        if not math.isfinite(radius_km) or radius_km <= 0:
+            raise ValueError("radius_km must be a positive number")
+    k = int(data.get('k', STORE_LOCATOR_CONFIG['DEFAULT_K']))
+    if k < 1:
+        raise ValueError("k must be at least 1")
+    return points, radius_km, k
+
+@app.route('/nearby-stores/bulk', methods=['POST'])
+def find_nearby_stores_bulk():
+    try:
+        points, radius_km, k = parse_bulk_request(request.json or {})
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    try:
+        index = store_index.get()
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    # One JSON object per point, then a summary line with throughput
+    return Response(stream_bulk_nearby(points, index, radius_km, k), mimetype='application/x-ndjson')
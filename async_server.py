@@ -0,0 +1,193 @@
+"""Async serving mode.
+
+Serves the same pages and APIs as the Flask app from one aiohttp event loop, so a
+search waiting on pharmacies doesn't hold a worker thread. Scrapers are awaited
+directly via `scrape_all`; Selenium work stays on the bounded `selenium_executor`
+and the remaining blocking calls (SQLite, template rendering, OmniDimension, Jan
+Aushadhi store list) run on a separate bounded pool.
+
+    python async_server.py
+"""
+import os
+import asyncio
+import threading
+import aiohttp
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+import app as medscan
+from config import SERVING_CONFIG, PRICE_HISTORY_CONFIG
+from matching import compare_prices
+from price_history import record_prices, get_price_trend, get_pharmacy_ranking, parse_days
+from circuit_breaker import scraper_breakers
+from store_locator import stream_bulk_nearby
+from profiling import RequestProfile, should_profile, bind, PROFILE_ID_HEADER
+
+# DB, template, OmniDimension and store list calls block; keep them off the event loop
+blocking_executor = ThreadPoolExecutor(max_workers=SERVING_CONFIG['BLOCKING_WORKERS'])
+
+PROFILED_ROUTES = {
+    '/': 'index',
+    '/chat': 'chat',
+    '/nearby-stores': 'find_nearby_stores',
+}
+
+
+async def run_blocking(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(blocking_executor, bind(fn), *args)
+
+
+def in_flask_context(fn, *args):
+    # Templates use url_for and the featured products query needs the Flask app context
+    with medscan.app.test_request_context():
+        return fn(*args)
+
+
+async def index(request):
+    if request.method == 'POST':
+        form = await request.post()
+        medicine = medscan.clean_medicine_name(form.get('medicine'))
+        quantity = form.get('quantity')
+        if not medicine:
+            html = await run_blocking(in_flask_context, medscan.render_home)
+            return web.Response(text=html, content_type='text/html', status=400)
+
+        print(f"\n🔍 Searching for: {medicine}, Quantity: {quantity}\n")
+        results = compare_prices(await medscan.scrape_all(medicine, request.app['http_session']))
+        await run_blocking(record_prices, medicine, results)
+        html = await run_blocking(in_flask_context, medscan.render_search_results, medicine, results)
+    else:
+        html = await run_blocking(in_flask_context, medscan.render_home)
+    return web.Response(text=html, content_type='text/html')
+
+
+async def chat(request):
+    if not medscan.agent_id:
+        return web.json_response({"error": "Chatbot not initialized"}, status=500)
+
+    try:
+        data = await request.json()
+        response = await run_blocking(medscan.ask_agent, data.get('message'))
+
+        # Get search results if medicine is mentioned
+        results = []
+        medicine_name = medscan.clean_medicine_name(response.get('extracted_variables', {}).get('medicine_name'))
+        if medicine_name:
+            results = compare_prices(await medscan.scrape_all(medicine_name, request.app['http_session']))
+            await run_blocking(record_prices, medicine_name, results)
+        return web.json_response(medscan.build_chat_response(response, results))
+
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+
+async def find_nearby_stores(request):
+    try:
+        data = await request.json()
+        stores = await run_blocking(
+            medscan.nearby_stores, float(data.get('latitude')), float(data.get('longitude'))
+        )
+        return web.json_response({"success": True, "stores": stores})
+
+    except Exception as e:
+        return web.json_response({"success": False, "error": str(e)}, status=500)
+
+
+async def find_nearby_stores_bulk(request):
+    try:
+        points, radius_km, k = medscan.parse_bulk_request(await request.json())
+    except (ValueError, TypeError, KeyError) as e:
+        return web.json_response({"success": False, "error": str(e)}, status=400)
+
+    try:
+        index = await run_blocking(medscan.store_index.get)
+    except Exception as e:
+        return web.json_response({"success": False, "error": str(e)}, status=500)
+
+    # Each chunk is computed off the loop, then written as soon as it is ready
+    response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+    await response.prepare(request)
+    lines = stream_bulk_nearby(points, index, radius_km, k)
+    while True:
+        chunk = await run_blocking(next, lines, None)
+        if chunk is None:
+            break
+        await response.write(chunk.encode('utf-8'))
+    await response.write_eof()
+    return response
+
+
+async def price_trend(request):
+    try:
+        series = await run_blocking(
+            get_price_trend,
+            request.match_info['medicine'],
+            request.query.get('pharmacy'),
+            parse_days(request.query.get('days'), PRICE_HISTORY_CONFIG['TREND_DAYS'])
+        )
+        return web.json_response({"success": True, "medicine": request.match_info['medicine'], "series": series})
+    except Exception as e:
+        return web.json_response({"success": False, "error": str(e)}, status=500)
+
+
+async def pharmacy_ranking(request):
+    try:
+        ranking = await run_blocking(
+            get_pharmacy_ranking,
+            request.match_info['medicine'],
+            parse_days(request.query.get('days'), PRICE_HISTORY_CONFIG['RANKING_DAYS'])
+        )
+        return web.json_response({"success": True, "medicine": request.match_info['medicine'], "ranking": ranking})
+    except Exception as e:
+        return web.json_response({"success": False, "error": str(e)}, status=500)
+
+
+async def scraper_health(request):
+    return web.json_response({"success": True, "pharmacies": scraper_breakers.states()})
+
+
+@web.middleware
+async def profiling_middleware(request, handler):
+    name = PROFILED_ROUTES.get(request.path)
+    if name is None or not should_profile(request.headers):
+        return await handler(request)
+
+    profile = RequestProfile(name, shared_thread=threading.get_ident())
+    profile.start()
+    try:
+        response = await handler(request)
+    finally:
+        # Joining the sampler and writing files block, so only stopping happens on the loop
+        profile.stop()
+        await run_blocking(profile.finish)
+    response.headers[PROFILE_ID_HEADER] = profile.id
+    return response
+
+
+async def open_http_session(application):
+    # One connection pool for every pharmacy fetch during the app's lifetime
+    application['http_session'] = aiohttp.ClientSession()
+
+
+async def close_http_session(application):
+    await application['http_session'].close()
+
+
+def create_app():
+    application = web.Application(middlewares=[profiling_middleware])
+    application.on_startup.append(open_http_session)
+    application.on_cleanup.append(close_http_session)
+    application.router.add_get('/', index)
+    application.router.add_post('/', index)
+    application.router.add_post('/chat', chat)
+    application.router.add_post('/nearby-stores', find_nearby_stores)
+    application.router.add_post('/nearby-stores/bulk', find_nearby_stores_bulk)
+    application.router.add_get('/api/price-trend/{medicine}', price_trend)
+    application.router.add_get('/api/pharmacy-ranking/{medicine}', pharmacy_ranking)
+    application.router.add_get('/scraper-health', scraper_health)
+    application.router.add_static('/static', os.path.join(medscan.basedir, 'static'))
+    return application
+
+
+if __name__ == '__main__':
+    medscan.seed_featured_products()
+    web.run_app(create_app(), port=SERVING_CONFIG['ASYNC_PORT'])
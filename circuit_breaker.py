@@ -0,0 +1,154 @@
+import time
+import threading
+from config import CIRCUIT_BREAKER_CONFIG
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class NoProductCards(Exception):
+    """Raised by a scraper when the results page has no product cards at all (blocked or markup changed)"""
+
+
+class CircuitBreaker:
+    """Skips a pharmacy after repeated no-card/error/timeout results, then probes it again"""
+
+    def __init__(self, name,
+                 failure_threshold=CIRCUIT_BREAKER_CONFIG['FAILURE_THRESHOLD'],
+                 cool_down=CIRCUIT_BREAKER_CONFIG['COOL_DOWN'],
+                 slow_call_seconds=CIRCUIT_BREAKER_CONFIG['SLOW_CALL_SECONDS']):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cool_down = cool_down
+        self.slow_call_seconds = slow_call_seconds
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.consecutive_timeouts = 0
+        self.opened_at = None
+        self.last_failure = None
+        self.skipped = 0
+
+    def allow_request(self):
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cool_down:
+                # Cool-down over: let exactly one request through as a probe
+                self.state = HALF_OPEN
+                print(f"[CircuitBreaker] {self.name} half-open, probing")
+                return True
+            self.skipped += 1
+            return False
+
+    def record_success(self):
+        with self.lock:
+            if self.state != CLOSED:
+                print(f"[CircuitBreaker] {self.name} closed")
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self.consecutive_timeouts = 0
+
+    def record_failure(self, reason):
+        with self.lock:
+            self.consecutive_failures += 1
+            if reason == 'timeout':
+                self.consecutive_timeouts += 1
+            self.last_failure = reason
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    print(f"[CircuitBreaker] {self.name} open after {self.consecutive_failures} failures ({reason})")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def _abandon_probe(self):
+        with self.lock:
+            if self.state == HALF_OPEN:
+                # opened_at is unchanged, so the cool-down has passed and the next request probes again
+                self.state = OPEN
+
+    def _record_outcome(self, results, elapsed):
+        # A quick empty result is a legitimate "no matches"; only a slow one counts against the site
+        if not results and elapsed >= self.slow_call_seconds:
+            self.record_failure('timeout')
+        else:
+            self.record_success()
+
+    def _record_error(self, error):
+        if isinstance(error, NoProductCards):
+            print(f"[CircuitBreaker] {self.name} found no product cards")
+            self.record_failure('no_cards')
+        else:
+            print(f"[CircuitBreaker] {self.name} error: {error}")
+            self.record_failure('error')
+
+    def call(self, scraper, *args):
+        """Run a Selenium scraper through the breaker; returns [] when skipped"""
+        if not self.allow_request():
+            print(f"[CircuitBreaker] Skipping {self.name} ({self.state})")
+            return []
+        start = time.monotonic()
+        try:
+            results = scraper(*args)
+        except Exception as e:
+            self._record_error(e)
+            return []
+        except BaseException:
+            # Cancelled (e.g. the client disconnected) or interrupted: no verdict on the site
+            self._abandon_probe()
+            raise
+        self._record_outcome(results, time.monotonic() - start)
+        return results
+
+    async def call_async(self, scraper, *args):
+        """Await an async scraper through the breaker; returns [] when skipped"""
+        if not self.allow_request():
+            print(f"[CircuitBreaker] Skipping {self.name} ({self.state})")
+            return []
+        start = time.monotonic()
+        try:
+            results = await scraper(*args)
+        except Exception as e:
+            self._record_error(e)
+            return []
+        except BaseException:
+            # Cancelled (e.g. the client disconnected) or interrupted: no verdict on the site
+            self._abandon_probe()
+            raise
+        self._record_outcome(results, time.monotonic() - start)
+        return results
+
+    def snapshot(self):
+        with self.lock:
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = max(0, round(self.cool_down - (time.monotonic() - self.opened_at), 1))
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'consecutive_timeouts': self.consecutive_timeouts,
+                'last_failure': self.last_failure,
+                'retry_in': retry_in,
+                'skipped': self.skipped,
+            }
+
+
+class BreakerRegistry:
+    def __init__(self):
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def get(self, name):
+        with self.lock:
+            if name not in self.breakers:
+                self.breakers[name] = CircuitBreaker(name)
+            return self.breakers[name]
+
+    def states(self):
+        with self.lock:
+            breakers = list(self.breakers.values())
+        return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+
+scraper_breakers = BreakerRegistry()
@@ -1,3 +1,8 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
 SCRAPING_CONFIG = {
     'CONCURRENT_REQUESTS': 4,
     'REQUEST_TIMEOUT': 10,
@@ -15,4 +20,76 @@ CACHE_CONFIG = {
     'ENABLED': True,
     'EXPIRE_AFTER': 3600,  # 1 hour
     'MAX_SIZE': 1000
-}
\ No newline at end of file
+}
+
+# Standard delivery charge per pharmacy, used when a scraper doesn't set one
+DELIVERY_CHARGES = {
+    'Apollo': 40,
+    '1mg': 25,
+    'PharmEasy': 50,
+    'TrueMeds': 35,
+}
+
+MATCHING_CONFIG = {
+    'INDEX_MAX_SIZE': 5000,  # product names kept in the canonical-ID index
+}
+
+PRICE_HISTORY_CONFIG = {
+    'DB_NAME': os.getenv('PRICE_HISTORY_DB', 'medicine_prices.db'),
+    'RETENTION_DAYS': 90,  # raw rows older than this are pruned by compaction
+    'TREND_DAYS': 30,
+    'RANKING_DAYS': 7,
+}
+
+CIRCUIT_BREAKER_CONFIG = {
+    'FAILURE_THRESHOLD': 3,  # consecutive no-card/error/timeout results before opening
+    'COOL_DOWN': 300,  # seconds to skip a pharmacy once its breaker opens
+    'SLOW_CALL_SECONDS': 15,  # empty results slower than this count as a timeout
+}
+
+SELECTOR_HEALTH_CONFIG = {
+    'CACHE_FILE': 'selector_health.json',  # last working selectors per pharmacy
+    # Lowercase text each site shows when a search has no matches; a page with neither
+    # product cards nor one of these is treated as broken by the circuit breaker
+    'NO_RESULTS_TEXT': {
+        'Apollo': ["no results found", "couldn't find any", "we couldn't find"],
+        '1mg': ["no results found", "sorry, we couldn't find", "did not match any"],
+        'PharmEasy': ["no results found", "sorry! no results", "couldn't find what you are looking for"],
+        'TrueMeds': ["no results found", "no products found", "no medicines found"],
+    },
+}
+
+# Base URLs of external sites; override with env vars to point at stub servers (see loadtest.py)
+SERVICE_URLS = {
+    'Apollo': os.getenv('APOLLO_BASE_URL', 'https://www.apollopharmacy.in'),
+    '1mg': os.getenv('ONEMG_BASE_URL', 'https://www.1mg.com'),
+    'PharmEasy': os.getenv('PHARMEASY_BASE_URL', 'https://pharmeasy.in'),
+    'TrueMeds': os.getenv('TRUEMEDS_BASE_URL', 'https://www.truemeds.in'),
+    'JanAushadhi': os.getenv('JAN_AUSHADHI_BASE_URL', 'https://janaushadhi.gov.in'),
+}
+
+PROFILING_CONFIG = {
+    'HEADER': 'X-MediScan-Profile',  # send "1" (when ENABLED) or the secret to profile a single request
+    'ENABLED': os.getenv('PROFILE_ENABLED', '0') == '1',  # accept the header with value "1"
+    'SECRET': os.getenv('PROFILE_SECRET'),  # header value that is always accepted, if set
+    'SAMPLE_RATE': float(os.getenv('PROFILE_SAMPLE_RATE', '0')),  # fraction of requests profiled
+    'INTERVAL': 0.005,  # seconds between stack samples
+    'OUTPUT_DIR': os.getenv('PROFILE_OUTPUT_DIR', 'profiles'),
+    'MAX_PROFILES': int(os.getenv('PROFILE_MAX_PROFILES', '200')),  # oldest profiles are deleted beyond this
+}
+
+SERVING_CONFIG = {
+    'SELENIUM_WORKERS': int(os.getenv('SELENIUM_WORKERS', '4')),  # max concurrent Selenium scrapers
+    'BLOCKING_WORKERS': int(os.getenv('BLOCKING_WORKERS', '16')),  # DB, template and API calls in async mode
+    'ASYNC_PORT': int(os.getenv('ASYNC_PORT', '8000')),
+}
+
+STORE_LOCATOR_CONFIG = {
+    'DEFAULT_RADIUS_KM': 5,
+    'DEFAULT_K': 5,
+    'CHUNK_SIZE': 512,  # points per vectorized batch; bounds the distance matrix memory
+    'MAX_POINTS': 100000,
+    'INDEX_TTL': 3600,  # seconds before the store list is re-fetched
+    'RETRY_AFTER': 60,  # seconds before retrying a refresh that came back empty
+    'FETCH_TIMEOUT': 10,  # seconds for the Jan Aushadhi store list request
+}
@@ -0,0 +1,459 @@
+"""Concurrency load test for MedScan.
+
+Starts stub pharmacy, Jan Aushadhi and OmniDimension servers with configurable
+latency, runs the app against them in a subprocess, then drives `/`, `/chat` and
+`/nearby-stores` with increasing numbers of concurrent virtual users. Each level
+records p50/p95/p99 latency, throughput, error rate, peak RSS and the peak number
+of Chrome browser and chromedriver processes, and the report shows where
+throughput stops scaling.
+
+    python loadtest.py --levels 1,2,4,8,16 --duration 30 --latency 0.3
+    python loadtest.py --mode async --levels 16,64,256
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+from urllib.parse import urlparse, parse_qs, unquote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+
+STUB_PHARMACIES = ['Apollo', '1mg', 'PharmEasy', 'TrueMeds', 'JanAushadhi', 'OmniDimension']
+
+ENV_NAMES = {
+    'Apollo': 'APOLLO_BASE_URL',
+    '1mg': 'ONEMG_BASE_URL',
+    'PharmEasy': 'PHARMEASY_BASE_URL',
+    'TrueMeds': 'TRUEMEDS_BASE_URL',
+    'JanAushadhi': 'JAN_AUSHADHI_BASE_URL',
+    'OmniDimension': 'LOADTEST_OMNIDIMENSION_URL',
+}
+
+MEDICINES = ['Dolo 650', 'Calpol 500', 'Crocin Advance', 'Azithral 500', 'Pan 40']
+
+
+# ---------------------------------------------------------------------------
+# Stub servers
+# ---------------------------------------------------------------------------
+
+def stub_products(query):
+    """Deterministic fake products for a search query"""
+    rng = random.Random(query)
+    base = query.strip().title() or 'Dolo 650'
+    return [
+        {
+            'name': f"{base} Tablet {pack}'s",
+            'price': round(rng.uniform(20, 200), 2),
+            'slug': f"{base.lower().replace(' ', '-')}-{i}",
+        }
+        for i, pack in enumerate([10, 15, 20, 30, 10])
+    ]
+
+
+def render_apollo(products):
+    cards = "".join(
+        f"<div class='ProductCard_productCardGrid__x'><div class='zb'><h2 class='jR'>{p['name']}</h2></div>"
+        f"<a href='/otc/{p['slug']}'>view</a><span class='zL_'>₹{p['price']}</span></div>"
+        for p in products
+    )
+    return f"<html><body>{cards}</body></html>"
+
+
+def render_pharmeasy(products):
+    cards = "".join(
+        f"<div class='ProductCard_productCard__ergV2'><a href='/online-medicine-order/{p['slug']}'>"
+        f"<h1 class='ProductCard_medicineName__8Ydfq'>{p['name']}</h1></a>"
+        f"<div class='ProductCard_gcdDiscountContainer__CCi51'>₹{p['price']}</div></div>"
+        for p in products
+    )
+    return f"<html><body>{cards}</body></html>"
+
+
+def render_1mg(products):
+    cards = "".join(
+        f"<div class='style_horizontal-card___1Zwmt'><a title=\"{p['name']}\" href='/drugs/{p['slug']}'>{p['name']}</a>"
+        f"<span class='style_price-tag'>₹{p['price']}</span></div>"
+        for p in products
+    )
+    return f"<html><body>{cards}</body></html>"
+
+
+def render_truemeds(products):
+    cards = "".join(
+        f"<div class='sc-a39eeb4f-1 zdA-dE'><div class='sc-a39eeb4f-12 daYLth'>{p['name']}</div>"
+        f"<span class='sc-a39eeb4f-14 faASZT'>Stub Labs</span>"
+        f"<span class='sc-a39eeb4f-17 iwZSqt'>₹{p['price']}</span>"
+        f"<img alt='Dolo {p['name']}' src='/images/TM-TACR1-{i:06d}.jpg'></div>"
+        for i, p in enumerate(products)
+    )
+    return f"<html><body>{cards}</body></html>"
+
+
+def stub_stores(count):
+    """Fake Jan Aushadhi Kendras scattered around central Delhi"""
+    rng = random.Random(count)
+    return [
+        {
+            'storeName': f"Jan Aushadhi Kendra {i}",
+            'address': f"Shop {i}, Stub Market",
+            'city': 'New Delhi',
+            'state': 'Delhi',
+            'latitude': str(28.6139 + rng.uniform(-0.3, 0.3)),
+            'longitude': str(77.2090 + rng.uniform(-0.3, 0.3)),
+            'mobileNo': f"9{i:09d}",
+        }
+        for i in range(count)
+    ]
+
+
+def make_stub_handler(service, latency, jitter, stores):
+    class StubHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _delay(self):
+            time.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+
+        def _send(self, body, content_type='text/html; charset=utf-8'):
+            data = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._delay()
+            url = urlparse(self.path)
+            if service == 'JanAushadhi':
+                return self._send(json.dumps(stores), 'application/json')
+            if service == 'Apollo':
+                query = unquote(url.path.rsplit('/', 1)[-1]).replace('-', ' ')
+                return self._send(render_apollo(stub_products(query)))
+            if service == 'TrueMeds':
+                query = unquote(url.path.rsplit('/', 1)[-1]).replace('+', ' ')
+                return self._send(render_truemeds(stub_products(query)))
+            query = parse_qs(url.query).get('name', [''])[0]
+            if service == 'PharmEasy':
+                return self._send(render_pharmeasy(stub_products(query)))
+            return self._send(render_1mg(stub_products(query)))
+
+        def do_POST(self):
+            self._delay()
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            medicine = payload.get('message', '').replace('price of', '').strip() or 'Dolo 650'
+            self._send(json.dumps({
+                'message': f"Here is what I found for {medicine}.",
+                'extracted_variables': {
+                    'medicine_name': medicine,
+                    'alternative_medicines': ['Calpol 650', 'Crocin 650'],
+                },
+            }), 'application/json')
+
+    return StubHandler
+
+
+def start_stub_servers(latency, jitter, store_count):
+    stores = stub_stores(store_count)
+    servers = {}
+    for service in STUB_PHARMACIES:
+        server = ThreadingHTTPServer(('127.0.0.1', 0), make_stub_handler(service, latency, jitter, stores))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers[service] = server
+    return servers
+
+
+class StubOmniClient:
+    """Stands in for omnidimension.Client, forwarding chat calls to the stub server"""
+
+    def __init__(self, base_url):
+        self.agent = self
+        self.base_url = base_url
+
+    def create(self, **kwargs):
+        return {'json': {'id': 'loadtest-agent'}}
+
+    def chat(self, agent_id, message):
+        return requests.post(f"{self.base_url}/agent/chat", json={'message': message}, timeout=30).json()
+
+
+# ---------------------------------------------------------------------------
+# App under test
+# ---------------------------------------------------------------------------
+
+def serve_app(port, mode):
+    """Run the app (Flask or async mode) with the OmniDimension client swapped for the stub"""
+    # Swap the client class before app is imported, since importing it creates the agent
+    import omnidimension
+    stub_url = os.environ[ENV_NAMES['OmniDimension']]
+    omnidimension.Client = lambda api_key=None: StubOmniClient(stub_url)
+    import app as medscan
+    if mode == 'async':
+        from aiohttp import web
+        from async_server import create_app
+        web.run_app(create_app(), host='127.0.0.1', port=port, print=None)
+    else:
+        medscan.app.run(host='127.0.0.1', port=port, threaded=True, use_reloader=False)
+
+
+def start_app(port, mode, servers, workdir):
+    env = dict(os.environ)
+    for service, server in servers.items():
+        env[ENV_NAMES[service]] = f"http://127.0.0.1:{server.server_address[1]}"
+    env['PRICE_HISTORY_DB'] = os.path.join(workdir, 'loadtest_prices.db')
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), 'serve-app', '--app-port', str(port), '--mode', mode],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+    )
+
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"App exited during startup with code {process.returncode}")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/scraper-health", timeout=2)
+            return process
+        except requests.RequestException:
+            time.sleep(0.5)
+    process.kill()
+    raise RuntimeError("App did not start within 120 s")
+
+
+# ---------------------------------------------------------------------------
+# Resource sampling (Linux /proc)
+# ---------------------------------------------------------------------------
+
+def process_tree(root_pid):
+    """Return {pid: (name, rss_kb)} for root_pid and all its descendants"""
+    procs = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/status") as f:
+                fields = dict(line.split(':', 1) for line in f if ':' in line)
+            procs[int(entry)] = (
+                int(fields['PPid'].strip()),
+                fields['Name'].strip(),
+                int(fields.get('VmRSS', '0 kB').split()[0]),
+            )
+        except (OSError, KeyError, ValueError):
+            continue
+
+    tree, stack = {}, [root_pid]
+    while stack:
+        pid = stack.pop()
+        if pid in procs and pid not in tree:
+            tree[pid] = procs[pid][1:]
+            stack.extend(child for child, info in procs.items() if info[0] == pid)
+    return tree
+
+
+class ResourceSampler:
+    def __init__(self, root_pid, interval=0.5):
+        self.root_pid = root_pid
+        self.interval = interval
+        self.peak_rss_mb = 0.0
+        self.peak_chrome = 0
+        self.peak_chromedriver = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            tree = process_tree(self.root_pid)
+            rss_mb = sum(rss for _, rss in tree.values()) / 1024
+            names = [name.lower() for name, _ in tree.values()]
+            drivers = sum(1 for name in names if name.startswith('chromedriver'))
+            browsers = sum(1 for name in names if 'chrom' in name and not name.startswith('chromedriver'))
+            self.peak_rss_mb = max(self.peak_rss_mb, rss_mb)
+            self.peak_chrome = max(self.peak_chrome, browsers)
+            self.peak_chromedriver = max(self.peak_chromedriver, drivers)
+            self.stop_event.wait(self.interval)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop_event.set()
+        self.thread.join()
+
+
+# ---------------------------------------------------------------------------
+# Load generation
+# ---------------------------------------------------------------------------
+
+def make_request(session, base_url, endpoint, timeout):
+    medicine = random.choice(MEDICINES)
+    if endpoint == 'index':
+        response = session.post(f"{base_url}/", data={'medicine': medicine, 'quantity': 1}, timeout=timeout)
+    elif endpoint == 'chat':
+        response = session.post(f"{base_url}/chat", json={'message': f"price of {medicine}"}, timeout=timeout)
+    else:
+        response = session.post(f"{base_url}/nearby-stores", json={
+            'latitude': 28.6139 + random.uniform(-0.1, 0.1),
+            'longitude': 77.2090 + random.uniform(-0.1, 0.1),
+        }, timeout=timeout)
+    return response.status_code < 400
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 3)
+
+
+def run_level(base_url, users, duration, mix, timeout, app_pid):
+    """Closed-loop run: each virtual user sends requests back-to-back until the deadline"""
+    latencies, errors, lock = [], [0], threading.Lock()
+    endpoints = [name for name, weight in mix.items() for _ in range(weight)]
+    deadline = time.monotonic() + duration
+
+    def virtual_user():
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            start = time.monotonic()
+            try:
+                ok = make_request(session, base_url, random.choice(endpoints), timeout)
+            except requests.RequestException:
+                ok = False
+            elapsed = time.monotonic() - start
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors[0] += 1
+
+    started = time.monotonic()
+    with ResourceSampler(app_pid) as sampler:
+        threads = [threading.Thread(target=virtual_user) for _ in range(users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    wall = time.monotonic() - started
+
+    return {
+        'users': users,
+        'requests': len(latencies),
+        'throughput_rps': round(len(latencies) / wall, 3),
+        'error_rate': round(errors[0] / len(latencies), 3) if latencies else None,
+        'p50_s': percentile(latencies, 50),
+        'p95_s': percentile(latencies, 95),
+        'p99_s': percentile(latencies, 99),
+        'peak_rss_mb': round(sampler.peak_rss_mb, 1),
+        'peak_chrome_processes': sampler.peak_chrome,
+        'peak_chromedriver_processes': sampler.peak_chromedriver,
+    }
+
+
+def find_saturation(levels, max_error_rate=0.01, min_gain=1.1):
+    """First level where throughput stops growing or errors appear"""
+    for previous, current in zip(levels, levels[1:]):
+        if (current['error_rate'] or 0) > max_error_rate:
+            return current['users'], f"error rate {current['error_rate']:.1%}"
+        if current['throughput_rps'] < previous['throughput_rps'] * min_gain:
+            return current['users'], (
+                f"throughput {current['throughput_rps']} rps vs {previous['throughput_rps']} rps "
+                f"at {previous['users']} users"
+            )
+    return None, "did not saturate in the tested range"
+
+
+def print_report(levels, saturation):
+    print("\nusers  reqs   rps     err    p50(s)  p95(s)  p99(s)  rss(MB)  chrome  driver")
+    top = max((level['throughput_rps'] for level in levels), default=0) or 1
+    for level in levels:
+        print(
+            f"{level['users']:>5}  {level['requests']:>5}  {level['throughput_rps']:>6}  "
+            f"{level['error_rate'] or 0:>5.1%}  {level['p50_s'] or 0:>6}  {level['p95_s'] or 0:>6}  "
+            f"{level['p99_s'] or 0:>6}  {level['peak_rss_mb']:>7}  {level['peak_chrome_processes']:>6}  "
+            f"{level['peak_chromedriver_processes']:>6}  "
+            + "#" * int(30 * level['throughput_rps'] / top)
+        )
+    users, reason = saturation
+    if users:
+        print(f"\n⚠️ Saturates at {users} concurrent users: {reason}")
+    else:
+        print(f"\n✅ {reason}")
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ('index', 'chat', 'nearby'):
+            raise argparse.ArgumentTypeError(f"unknown endpoint {name!r}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MedScan concurrency load test")
+    parser.add_argument('command', nargs='?', default='run', choices=['run', 'serve-app'])
+    parser.add_argument('--levels', default='1,2,4,8,16', help="comma-separated virtual user counts")
+    parser.add_argument('--duration', type=float, default=30, help="seconds per concurrency level")
+    parser.add_argument('--latency', type=float, default=0.3, help="stub server response latency (s)")
+    parser.add_argument('--jitter', type=float, default=0.05, help="random +/- latency jitter (s)")
+    parser.add_argument('--stores', type=int, default=2000, help="number of stub Jan Aushadhi stores")
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('index=1,chat=1,nearby=1'),
+                        help="endpoint weights, e.g. index=2,chat=1,nearby=1")
+    parser.add_argument('--timeout', type=float, default=180, help="per-request timeout (s)")
+    parser.add_argument('--app-port', type=int, default=5055)
+    parser.add_argument('--mode', default='flask', choices=['flask', 'async'],
+                        help="serve with the threaded Flask server or async_server.py")
+    parser.add_argument('--output', default='loadtest_report.json')
+    args = parser.parse_args()
+
+    if args.command == 'serve-app':
+        return serve_app(args.app_port, args.mode)
+
+    servers = start_stub_servers(args.latency, args.jitter, args.stores)
+    workdir = tempfile.mkdtemp(prefix='medscan-loadtest-')
+    app_process = start_app(args.app_port, args.mode, servers, workdir)
+    base_url = f"http://127.0.0.1:{args.app_port}"
+
+    levels = []
+    try:
+        for users in [int(level) for level in args.levels.split(',')]:
+            print(f"[LoadTest] {users} virtual users for {args.duration}s...")
+            levels.append(run_level(base_url, users, args.duration, args.mix, args.timeout, app_process.pid))
+    finally:
+        app_process.terminate()
+        try:
+            app_process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            app_process.kill()
+        for server in servers.values():
+            server.shutdown()
+
+    saturation = find_saturation(levels)
+    print_report(levels, saturation)
+    with open(args.output, 'w') as f:
+        json.dump({
+            'config': {
+                'mode': args.mode,
+                'latency': args.latency,
+                'jitter': args.jitter,
+                'duration': args.duration,
+                'mix': args.mix,
+                'stores': args.stores,
+            },
+            'levels': levels,
+            'saturation': {'users': saturation[0], 'reason': saturation[1]},
+        }, f, indent=2)
+    print(f"[LoadTest] Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+import re
+import threading
+from collections import OrderedDict
+from config import DELIVERY_CHARGES, MATCHING_CONFIG
+
+# Strength like "650mg", "0.5 mg", "500 mcg", "1g", "5 ml", "2% w/w"
+STRENGTH_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(mg|mcg|µg|g|gm|ml|iu|%)(?![a-z])', re.IGNORECASE)
+
+# Unitless strength in brand names like "Dolo 650 Tablet(s)" (assumed mg); "strip of 15 tablets" is a count
+BARE_STRENGTH_RE = re.compile(
+    r'(?<!of )\b(\d+(?:\.\d+)?)\s+(?=(?:tablets?|capsules?|tabs?|caps?)\b)', re.IGNORECASE
+)
+
+# Pack size like "15s", "15's", "strip of 15 tablets", "10 tablets", "Tablet 10", "pack of 10", "x 10".
+# Only applied after the strength has been removed, so "Dolo 650 Tablets" never reads as 650 units.
+PACK_RES = [
+    re.compile(r'(?:strip|pack|bottle|box)\s+of\s+(\d+)', re.IGNORECASE),
+    re.compile(r"\b(\d+)\s*'?s\b", re.IGNORECASE),
+    re.compile(r'(\d+)\s*(?:tablets|tabs|capsules|caps|sachets|softgels|units)\b', re.IGNORECASE),
+    re.compile(r'\b(?:tablets?|tabs?|capsules?|caps?)\s+(\d+)\b', re.IGNORECASE),
+    re.compile(r'\bx\s*(\d+)\b', re.IGNORECASE),
+]
+
+# Words that describe the dosage form or packaging, not the product itself
+NOISE_WORDS = {
+    'tablet', 'tablets', 'tab', 'tabs', 'capsule', 'capsules', 'cap', 'caps',
+    'strip', 'strips', 'pack', 'of', 's', 'bottle', 'box', 'x', 'sachet',
+    'sachets', 'softgel', 'softgels', 'unit', 'units', 'syrup', 'ml',
+}
+
+# Unit conversions to a common base so "1g" and "1000mg" compare equal
+UNIT_SCALE = {'mg': 1.0, 'mcg': 0.001, 'µg': 0.001, 'g': 1000.0, 'gm': 1000.0}
+
+
+def _split_strength(name):
+    """Return (strength, text with the strength removed); strength is (value, unit) or None"""
+    text = name or ''
+    match = STRENGTH_RE.search(text)
+    if match:
+        value, unit = float(match.group(1)), match.group(2).lower()
+        strength = (value * UNIT_SCALE[unit], 'mg') if unit in UNIT_SCALE else (value, unit)
+        return strength, STRENGTH_RE.sub(' ', text)
+
+    bare = BARE_STRENGTH_RE.search(text)
+    if bare:
+        return (float(bare.group(1)), 'mg'), text[:bare.start(1)] + ' ' + text[bare.end(1):]
+    return None, text
+
+
+def parse_strength(name):
+    """Return (value, unit) for the strength in a product name, or None"""
+    return _split_strength(name)[0]
+
+
+def parse_pack_size(name):
+    """Return the number of units in the pack, or None if the name doesn't say"""
+    # Strip the strength first so "650mg" or "Dolo 650 Tablets" is never read as a pack of 650
+    text = _split_strength(name)[1]
+    for pattern in PACK_RES:
+        match = pattern.search(text)
+        if match and int(match.group(1)) > 0:
+            return int(match.group(1))
+    return None
+
+
+def canonical_key(name):
+    """Normalize a product name to "<base words>|<strength>" for grouping"""
+    # TrueMeds appends "by <manufacturer>"
+    base = re.split(r'\s+by\s+', name or '', maxsplit=1, flags=re.IGNORECASE)[0]
+    strength, text = _split_strength(base)
+
+    for pattern in PACK_RES:
+        text = pattern.sub(' ', text)
+    words = [w for w in re.findall(r'[a-z0-9]+', text.lower()) if w not in NOISE_WORDS]
+
+    # "Dolo 650 Tablet" and "Dolo 650mg Tablet" are the same product
+    if strength:
+        strength_text = f"{strength[0]:g}"
+        words = [w for w in words if w != strength_text]
+        return f"{' '.join(words)}|{strength_text}{strength[1]}"
+    return f"{' '.join(words)}|"
+
+
+class ProductIndex:
+    """Maps product names to small integer canonical IDs, reused across searches"""
+
+    def __init__(self, max_size=MATCHING_CONFIG['INDEX_MAX_SIZE']):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.names = OrderedDict()  # name -> (canonical key, pack_size)
+        self.keys = OrderedDict()  # canonical key -> canonical_id
+        self.next_id = 0
+
+    def _key_id(self, key):
+        canonical_id = self.keys.get(key)
+        if canonical_id is None:
+            canonical_id = self.next_id
+            self.next_id += 1
+            self.keys[key] = canonical_id
+            # Keys touched by the current search are most recent, so its groups stay intact
+            while len(self.keys) > self.max_size:
+                self.keys.popitem(last=False)
+        else:
+            self.keys.move_to_end(key)
+        return canonical_id
+
+    def lookup(self, name):
+        with self.lock:
+            entry = self.names.get(name)
+            if entry is not None:
+                self.names.move_to_end(name)
+                return self._key_id(entry[0]), entry[1]
+
+        # Parse outside the lock; it's pure and the slowest part
+        entry = (canonical_key(name), parse_pack_size(name))
+        with self.lock:
+            self.names[name] = entry
+            self.names.move_to_end(name)
+            while len(self.names) > self.max_size:
+                self.names.popitem(last=False)
+            return self._key_id(entry[0]), entry[1]
+
+
+product_index = ProductIndex()
+
+
+def compare_prices(results, index=product_index):
+    """Annotate results with pack size, group and per-unit prices, sorted cheapest first.
+
+    Offers of the same product stay together. Within a group, offers with a known
+    pack size come first, ordered by delivered price per unit, followed by offers
+    with an unknown pack size ordered by delivered pack price. Groups with per-unit
+    prices are ranked by their best unit price, ahead of groups that only have pack
+    prices, so a per-unit price is never compared with a per-pack one.
+    """
+    if not results:
+        return []
+
+    # One pass: look up canonical IDs and fill in all derived prices
+    best_by_group = {}
+    for item in results:
+        canonical_id, pack_size = index.lookup(item.get('name', ''))
+        delivery = item.get('delivery')
+        if delivery is None:
+            delivery = DELIVERY_CHARGES.get(item.get('pharmacy'), 0)
+        price = float(item['price'])
+
+        item['delivery'] = delivery
+        item['final_price'] = price + delivery
+        item['pack_size'] = pack_size
+        item['group_id'] = canonical_id
+        if pack_size:
+            item['unit_price'] = round(price / pack_size, 2)
+            item['unit_final_price'] = round((price + delivery) / pack_size, 2)
+            rank = (0, item['unit_final_price'])
+        else:
+            item['unit_price'] = None
+            item['unit_final_price'] = None
+            rank = (1, item['final_price'])
+
+        if rank < best_by_group.get(canonical_id, (2, 0)):
+            best_by_group[canonical_id] = rank
+
+    results.sort(key=lambda x: (
+        best_by_group[x['group_id']],
+        x['group_id'],
+        x['pack_size'] is None,
+        x['unit_final_price'] if x['pack_size'] else x['final_price'],
+    ))
+    return results
+
+
+def group_results(results):
+    """Group results already passed through compare_prices by canonical ID"""
+    groups = OrderedDict()
+    for item in results:
+        group = groups.setdefault(item['group_id'], {
+            'group_id': item['group_id'],
+            'name': item['name'],
+            'offers': [],
+        })
+        group['offers'].append(item)
+
+    for group in groups.values():
+        # Offers with a known pack size are sorted first
+        cheapest = group['offers'][0]
+        group['cheapest_pharmacy'] = cheapest['pharmacy']
+        group['best_unit_price'] = cheapest['unit_final_price']
+    return list(groups.values())
@@ -0,0 +1,248 @@
+import os
+import sqlite3
+import argparse
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from config import PRICE_HISTORY_CONFIG
+from matching import canonical_key
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+DB_PATH = os.path.join(basedir, PRICE_HISTORY_CONFIG['DB_NAME'])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS medicine_prices (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    medicine_name TEXT,
+    pharmacy_name TEXT,
+    price REAL,
+    url TEXT,
+    in_stock BOOLEAN,
+    scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    product_key TEXT,
+    unit_price REAL,
+    final_price REAL
+);
+
+CREATE INDEX IF NOT EXISTS idx_medicine_prices_scraped_at
+    ON medicine_prices (scraped_at);
+
+-- One row per medicine, product, price basis, pharmacy and day; avg is price_sum / sample_count.
+-- Both bases include delivery: 'unit' aggregates delivered per-unit prices, 'pack' aggregates
+-- delivered pack prices when the pack size is unknown, so a series never mixes the two.
+-- Rows recorded before final_price existed fall back to the raw price.
+CREATE TABLE IF NOT EXISTS price_daily_rollup (
+    medicine_name TEXT COLLATE NOCASE NOT NULL,
+    product_key TEXT NOT NULL,
+    basis TEXT NOT NULL,
+    pharmacy_name TEXT NOT NULL,
+    day DATE NOT NULL,
+    sample_count INTEGER NOT NULL,
+    price_sum REAL NOT NULL,
+    min_price REAL NOT NULL,
+    max_price REAL NOT NULL,
+    PRIMARY KEY (medicine_name, product_key, basis, pharmacy_name, day)
+);
+
+CREATE INDEX IF NOT EXISTS idx_price_daily_rollup_day
+    ON price_daily_rollup (medicine_name, day);
+
+-- Keep the rollup current as raw rows arrive
+CREATE TRIGGER IF NOT EXISTS trg_medicine_prices_rollup
+AFTER INSERT ON medicine_prices
+WHEN NEW.price IS NOT NULL
+BEGIN
+    INSERT INTO price_daily_rollup (
+        medicine_name, product_key, basis, pharmacy_name, day,
+        sample_count, price_sum, min_price, max_price
+    )
+    VALUES (
+        NEW.medicine_name, COALESCE(NEW.product_key, ''),
+        CASE WHEN NEW.unit_price IS NULL THEN 'pack' ELSE 'unit' END,
+        NEW.pharmacy_name, DATE(NEW.scraped_at), 1,
+        COALESCE(NEW.unit_price, NEW.final_price, NEW.price),
+        COALESCE(NEW.unit_price, NEW.final_price, NEW.price),
+        COALESCE(NEW.unit_price, NEW.final_price, NEW.price)
+    )
+    ON CONFLICT (medicine_name, product_key, basis, pharmacy_name, day) DO UPDATE SET
+        sample_count = sample_count + 1,
+        price_sum = price_sum + excluded.price_sum,
+        min_price = MIN(min_price, excluded.min_price),
+        max_price = MAX(max_price, excluded.max_price);
+END;
+"""
+
+BACKFILL = """
+INSERT INTO price_daily_rollup (
+    medicine_name, product_key, basis, pharmacy_name, day,
+    sample_count, price_sum, min_price, max_price
+)
+SELECT medicine_name, COALESCE(product_key, ''),
+       CASE WHEN unit_price IS NULL THEN 'pack' ELSE 'unit' END,
+       pharmacy_name, DATE(scraped_at), COUNT(*),
+       SUM(COALESCE(unit_price, final_price, price)), MIN(COALESCE(unit_price, final_price, price)),
+       MAX(COALESCE(unit_price, final_price, price))
+FROM medicine_prices
+WHERE price IS NOT NULL
+GROUP BY medicine_name COLLATE NOCASE, COALESCE(product_key, ''),
+         CASE WHEN unit_price IS NULL THEN 'pack' ELSE 'unit' END, pharmacy_name, DATE(scraped_at)
+"""
+
+# Columns added to medicine_prices after the original schema
+MIGRATIONS = {
+    'product_key': "ALTER TABLE medicine_prices ADD COLUMN product_key TEXT",
+    'unit_price': "ALTER TABLE medicine_prices ADD COLUMN unit_price REAL",
+    'final_price': "ALTER TABLE medicine_prices ADD COLUMN final_price REAL",
+}
+
+
+@contextmanager
+def get_connection(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _columns(conn, table):
+    return {row['name'] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def init_price_history(db_path=DB_PATH):
+    """Create the rollup table and trigger, backfilling from existing raw rows"""
+    with get_connection(db_path) as conn:
+        existing = _columns(conn, 'medicine_prices')
+        added = set()
+        if existing:
+            for column, statement in MIGRATIONS.items():
+                if column not in existing:
+                    conn.execute(statement)
+                    added.add(column)
+        # Older rollups mixed pack and unit prices, or pack prices without delivery, and the
+        # trigger that wrote them is out of date; rebuild both from raw rows
+        rollup = _columns(conn, 'price_daily_rollup')
+        if rollup and ('product_key' not in rollup or added):
+            conn.execute("DROP TRIGGER IF EXISTS trg_medicine_prices_rollup")
+            conn.execute("DROP TABLE price_daily_rollup")
+        conn.executescript(SCHEMA)
+        if conn.execute("SELECT COUNT(*) FROM price_daily_rollup").fetchone()[0] == 0:
+            conn.execute(BACKFILL)
+    print("✅ Price history rollups ready")
+
+
+def record_prices(medicine, results, db_path=DB_PATH):
+    """Store scraped results as raw price rows; the trigger updates the rollups.
+
+    Results must have been through compare_prices, which supplies the delivered pack
+    and per-unit prices. Scrapers don't report stock, so in_stock is left NULL.
+    """
+    rows = [
+        (medicine, item['pharmacy'], item['price'], item.get('link'),
+         canonical_key(item.get('name', '')), item.get('unit_final_price'), item.get('final_price'))
+        for item in results
+        if item.get('price')
+    ]
+    if not rows:
+        return 0
+    try:
+        with get_connection(db_path) as conn:
+            conn.executemany(
+                "INSERT INTO medicine_prices "
+                "(medicine_name, pharmacy_name, price, url, product_key, unit_price, final_price) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+    except sqlite3.Error as e:
+        print(f"[PriceHistory] Failed to record prices: {e}")
+        return 0
+    return len(rows)
+
+
+def parse_days(value, default):
+    """Window length from a query string value; missing, invalid or non-positive values use the default"""
+    try:
+        days = int(value)
+    except (TypeError, ValueError):
+        return default
+    return days if days > 0 else default
+
+
+def _since(days):
+    return (datetime.utcnow().date() - timedelta(days=days - 1)).isoformat()
+
+
+def get_price_trend(medicine, pharmacy=None, days=PRICE_HISTORY_CONFIG['TREND_DAYS'], db_path=DB_PATH):
+    """Daily min/avg/max price, one series per pharmacy, product and price basis"""
+    query = (
+        "SELECT pharmacy_name, product_key, basis, day, sample_count, price_sum, min_price, max_price "
+        "FROM price_daily_rollup WHERE medicine_name = ? AND day >= ?"
+    )
+    params = [medicine, _since(days)]
+    if pharmacy:
+        query += " AND pharmacy_name = ?"
+        params.append(pharmacy)
+    query += " ORDER BY pharmacy_name, product_key, basis, day"
+
+    series = {}
+    with get_connection(db_path) as conn:
+        for row in conn.execute(query, params):
+            pharmacy_series = series.setdefault(row['pharmacy_name'], [])
+            if not pharmacy_series or (pharmacy_series[-1]['product'], pharmacy_series[-1]['basis']) != \
+                    (row['product_key'], row['basis']):
+                pharmacy_series.append({'product': row['product_key'], 'basis': row['basis'], 'days': []})
+            pharmacy_series[-1]['days'].append({
+                'day': row['day'],
+                'min': row['min_price'],
+                'avg': round(row['price_sum'] / row['sample_count'], 2),
+                'max': row['max_price'],
+            })
+    return series
+
+
+def get_pharmacy_ranking(medicine, days=PRICE_HISTORY_CONFIG['RANKING_DAYS'], db_path=DB_PATH):
+    """Pharmacies ordered by their lowest price for each product of a medicine over the window"""
+    query = (
+        "SELECT product_key, basis, pharmacy_name, MIN(min_price) AS min_price, "
+        "SUM(price_sum) / SUM(sample_count) AS avg_price "
+        "FROM price_daily_rollup WHERE medicine_name = ? AND day >= ? "
+        "GROUP BY product_key, basis, pharmacy_name ORDER BY product_key, basis DESC, min_price"
+    )
+    with get_connection(db_path) as conn:
+        rows = conn.execute(query, (medicine, _since(days))).fetchall()
+    return [
+        {
+            'product': row['product_key'],
+            'basis': row['basis'],
+            'pharmacy': row['pharmacy_name'],
+            'min_price': row['min_price'],
+            'avg_price': round(row['avg_price'], 2),
+        }
+        for row in rows
+    ]
+
+
+def compact_price_history(retention_days=PRICE_HISTORY_CONFIG['RETENTION_DAYS'], db_path=DB_PATH):
+    """Delete raw rows older than the retention window; rollups are kept"""
+    cutoff = (datetime.utcnow() - timedelta(days=retention_days)).strftime('%Y-%m-%d %H:%M:%S')
+    with get_connection(db_path) as conn:
+        deleted = conn.execute(
+            "DELETE FROM medicine_prices WHERE scraped_at < ?", (cutoff,)
+        ).rowcount
+    with get_connection(db_path) as conn:
+        conn.execute("VACUUM")
+    print(f"[PriceHistory] Pruned {deleted} raw rows older than {retention_days} days")
+    return deleted
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Price history maintenance")
+    parser.add_argument('command', choices=['init', 'compact'])
+    parser.add_argument('--days', type=int, default=PRICE_HISTORY_CONFIG['RETENTION_DAYS'],
+                        help="retention window for compact")
+    args = parser.parse_args()
+
+    init_price_history()
+    if args.command == 'compact':
+        compact_price_history(args.days)
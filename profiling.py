@@ -0,0 +1,303 @@
+import os
+import sys
+import hmac
+import json
+import time
+import uuid
+import random
+import asyncio
+import threading
+import contextvars
+from functools import wraps
+from collections import Counter
+from flask import request, after_this_request
+from config import PROFILING_CONFIG
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+OUTPUT_DIR = os.path.join(basedir, PROFILING_CONFIG['OUTPUT_DIR'])
+
+PROFILE_ID_HEADER = 'X-MediScan-Profile-Id'
+PROFILE_SUFFIXES = ('.collapsed', '.speedscope.json', '.spans.json')
+
+# Innermost open span for the current request; asyncio tasks inherit a copy automatically
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    def __init__(self, profile, name, parent):
+        self.profile = profile
+        self.name = name
+        self.parent = parent
+        self.children = []
+        self.thread = threading.current_thread().name
+        self.start = None
+        self.end = None
+        self.token = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.profile.watch_thread(threading.get_ident(), 1)
+        if self.parent is not None:
+            with self.profile.lock:
+                self.parent.children.append(self)
+        self.token = _current_span.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        self.end = time.perf_counter()
+        _current_span.reset(self.token)
+        self.profile.watch_thread(threading.get_ident(), -1)
+
+    def to_dict(self, origin):
+        return {
+            'name': self.name,
+            'thread': self.thread,
+            'start_ms': round((self.start - origin) * 1000, 3),
+            'duration_ms': round(((self.end or time.perf_counter()) - self.start) * 1000, 3),
+            'children': [child.to_dict(origin) for child in self.children],
+        }
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+def span(name):
+    """Time a stage of the current request; a no-op unless the request is being profiled"""
+    parent = _current_span.get()
+    if parent is None:
+        return NULL_SPAN
+    return Span(parent.profile, name, parent)
+
+
+def stage(name):
+    """Decorator form of span() for sync and async functions"""
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if _current_span.get() is None:
+                    return await fn(*args, **kwargs)
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def bind(fn):
+    """Carry the current span into a thread-pool worker (executors don't copy context)"""
+    if _current_span.get() is None:
+        return fn
+    context = contextvars.copy_context()
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        return context.run(fn, *args, **kwargs)
+    return wrapper
+
+
+class RequestProfile:
+    """Span tree plus a stack sampler over every thread that works on the request"""
+
+    def __init__(self, name, interval=PROFILING_CONFIG['INTERVAL'], shared_thread=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.thread_ids = Counter()  # threads with open spans -> number of open spans
+        self.samples = Counter()
+        # An event loop thread also runs other requests, so its samples are labelled as shared
+        self.shared_thread = shared_thread
+        self.root = Span(self, name, None)
+        self.stop_event = threading.Event()
+        self.sampler = threading.Thread(target=self._sample, name=f"profiler-{self.id}", daemon=True)
+
+    def watch_thread(self, thread_id, delta):
+        """Only sample threads while they are inside one of this request's spans"""
+        with self.lock:
+            self.thread_ids[thread_id] += delta
+            if self.thread_ids[thread_id] <= 0:
+                del self.thread_ids[thread_id]
+
+    def _sample(self):
+        names = {}
+        while not self.stop_event.wait(self.interval):
+            with self.lock:
+                thread_ids = list(self.thread_ids)
+            frames = sys._current_frames()
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                if thread_id not in names:
+                    names[thread_id] = next(
+                        (t.name for t in threading.enumerate() if t.ident == thread_id), str(thread_id)
+                    )
+                    if thread_id == self.shared_thread:
+                        names[thread_id] += " (shared with concurrent requests)"
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names[thread_id])
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self.sampler.start()
+        self.root.__enter__()
+
+    def stop(self):
+        """Close the root span and signal the sampler; must run in the context that called start()"""
+        self.root.__exit__()
+        self.stop_event.set()
+
+    def finish(self):
+        """Wait for the sampler and write the profile files; blocking, so keep it off event loops"""
+        self.sampler.join()
+        try:
+            self.write()
+        except OSError as e:
+            print(f"[Profiler] Failed to write profile {self.id}: {e}")
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        self.finish()
+
+    def _speedscope(self):
+        """Span tree as speedscope evented profiles; overlapping spans go to separate lanes"""
+        frames, frame_index = [], {}
+        spans, pending = [], [self.root]
+        while pending:
+            current = pending.pop()
+            spans.append(current)
+            pending.extend(current.children)
+        spans.sort(key=lambda s: (s.start, -(s.end or s.start)))
+
+        origin = self.root.start
+        lanes = []  # each lane: (events, stack of open spans)
+        for current in spans:
+            end = current.end or self.root.end
+            if current.name not in frame_index:
+                frame_index[current.name] = len(frames)
+                frames.append({'name': current.name})
+            for events, stack in lanes:
+                while stack and (stack[-1].end or self.root.end) <= current.start:
+                    closed = stack.pop()
+                    events.append({'type': 'C', 'frame': frame_index[closed.name],
+                                   'at': ((closed.end or self.root.end) - origin) * 1000})
+                if not stack or (stack[-1].end or self.root.end) >= end:
+                    break
+            else:
+                lanes.append(([], []))
+                events, stack = lanes[-1]
+            stack.append(current)
+            events.append({'type': 'O', 'frame': frame_index[current.name], 'at': (current.start - origin) * 1000})
+
+        end_ms = (self.root.end - origin) * 1000
+        profiles = []
+        for i, (events, stack) in enumerate(lanes):
+            while stack:
+                closed = stack.pop()
+                events.append({'type': 'C', 'frame': frame_index[closed.name],
+                               'at': ((closed.end or self.root.end) - origin) * 1000})
+            profiles.append({
+                'type': 'evented',
+                'name': f"{self.name} lane {i}",
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': end_ms,
+                'events': events,
+            })
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': f"{self.name} {self.id}",
+            'shared': {'frames': frames},
+            'profiles': profiles,
+        }
+
+    def write(self):
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        base = os.path.join(OUTPUT_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{self.name}-{self.id}")
+        with open(base + '.collapsed', 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(base + '.speedscope.json', 'w') as f:
+            json.dump(self._speedscope(), f)
+        with open(base + '.spans.json', 'w') as f:
+            json.dump(self.root.to_dict(self.root.start), f, indent=2)
+        print(f"[Profiler] {self.name} took {(self.root.end - self.root.start) * 1000:.0f} ms, wrote {base}.*")
+        prune_profiles()
+
+
+def prune_profiles(max_profiles=PROFILING_CONFIG['MAX_PROFILES']):
+    """Delete the oldest profiles beyond max_profiles; names start with a timestamp, so they sort by age"""
+    bases = sorted({
+        name[:-len(suffix)]
+        for name in os.listdir(OUTPUT_DIR)
+        for suffix in PROFILE_SUFFIXES
+        if name.endswith(suffix)
+    })
+    for base in bases[:max(0, len(bases) - max_profiles)]:
+        for suffix in PROFILE_SUFFIXES:
+            try:
+                os.remove(os.path.join(OUTPUT_DIR, base + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def should_profile(headers):
+    """True when the request asks for a profile by header or is picked by the sample rate.
+
+    The header is honored only when profiling is enabled in config, or when it carries
+    the shared secret, so clients can't make the server write profiles at will.
+    """
+    requested = headers.get(PROFILING_CONFIG['HEADER'])
+    if requested:
+        if PROFILING_CONFIG['ENABLED'] and requested == '1':
+            return True
+        secret = PROFILING_CONFIG['SECRET']
+        if secret and hmac.compare_digest(requested.encode(), secret.encode()):
+            return True
+    rate = PROFILING_CONFIG['SAMPLE_RATE']
+    return rate > 0 and random.random() < rate
+
+
+def profile_request(name):
+    """Route decorator: profile the request when asked by header or picked by the sample rate"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not should_profile(request.headers):
+                return view(*args, **kwargs)
+
+            profile = RequestProfile(name)
+
+            @after_this_request
+            def add_profile_header(response):
+                response.headers[PROFILE_ID_HEADER] = profile.id
+                return response
+
+            with profile:
+                return view(*args, **kwargs)
+        return wrapper
+    return decorator
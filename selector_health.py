@@ -0,0 +1,77 @@
+import os
+import re
+import json
+import threading
+from selenium.webdriver.common.by import By
+from config import SELECTOR_HEALTH_CONFIG
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+
+
+class SelectorHealth:
+    """Remembers which CSS selector last worked per pharmacy, persisted to a JSON file"""
+
+    def __init__(self, path=os.path.join(basedir, SELECTOR_HEALTH_CONFIG['CACHE_FILE'])):
+        self.path = path
+        self.lock = threading.Lock()
+        self.selectors = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self.selectors = json.load(f)
+            except (ValueError, OSError) as e:
+                print(f"[SelectorHealth] Ignoring unreadable cache: {e}")
+
+    def ordered(self, pharmacy, kind, selectors):
+        """Return selectors with the last one that worked moved to the front"""
+        last = self.selectors.get(pharmacy, {}).get(kind)
+        if last in selectors:
+            return [last] + [s for s in selectors if s != last]
+        return list(selectors)
+
+    def remember(self, pharmacy, kind, selector):
+        with self.lock:
+            if self.selectors.get(pharmacy, {}).get(kind) == selector:
+                return
+            self.selectors.setdefault(pharmacy, {})[kind] = selector
+            try:
+                with open(self.path, 'w') as f:
+                    json.dump(self.selectors, f)
+            except OSError as e:
+                print(f"[SelectorHealth] Failed to save cache: {e}")
+
+
+def shows_no_results(pharmacy, text):
+    """True when page text carries the pharmacy's "no results" message"""
+    text = (text or '').lower().replace('\u2019', "'")
+    return any(marker in text for marker in SELECTOR_HEALTH_CONFIG['NO_RESULTS_TEXT'].get(pharmacy, ()))
+
+
+def any_selector_present(selectors, pharmacy=None):
+    """WebDriverWait condition that resolves with (selector, elements) for the first match.
+
+    With a pharmacy, it also resolves with (None, []) as soon as the page shows that
+    pharmacy's "no results" message, so an empty search doesn't wait out the timeout.
+    """
+    def condition(driver):
+        for selector in selectors:
+            elements = driver.find_elements(By.CSS_SELECTOR, selector)
+            if elements:
+                return selector, elements
+        if pharmacy and shows_no_results(pharmacy, driver.find_element(By.TAG_NAME, 'body').text):
+            return None, []
+        return False
+    return condition
+
+
+def first_price_text(element, selectors):
+    """Return (selector, text) for the first selector under element whose text has a digit, or (None, None)"""
+    for selector in selectors:
+        for found in element.find_elements(By.CSS_SELECTOR, selector):
+            text = found.text.strip()
+            if re.search(r'\d', text):
+                return selector, text
+    return None, None
+
+
+selector_health = SelectorHealth()
@@ -0,0 +1,171 @@
+import json
+import time
+import threading
+import numpy as np
+from config import STORE_LOCATOR_CONFIG
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+class StoreIndex:
+    """Store coordinates as numpy arrays for vectorized distance queries"""
+
+    def __init__(self, stores):
+        self.stores = [store for store in stores if store['lat'] and store['lng']]  # Validate coordinates
+        self.lat = np.radians(np.array([store['lat'] for store in self.stores], dtype=float))
+        self.lng = np.radians(np.array([store['lng'] for store in self.stores], dtype=float))
+        self.cos_lat = np.cos(self.lat)
+
+    def __len__(self):
+        return len(self.stores)
+
+    def distances(self, lat, lng):
+        """Haversine distance in km from each point (degrees) to every store, shape (points, stores)"""
+        point_lat = np.radians(lat)[:, None]
+        point_lng = np.radians(lng)[:, None]
+        a = (np.sin((self.lat - point_lat) / 2) ** 2
+             + np.cos(point_lat) * self.cos_lat * np.sin((self.lng - point_lng) / 2) ** 2)
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class CachedStoreIndex:
+    """Builds a StoreIndex from a store loader and reuses it until the TTL expires.
+
+    The loader runs outside the state lock. Once an index exists, an expired one keeps
+    being served while a single background thread refreshes it.
+    """
+
+    def __init__(self, loader, ttl=STORE_LOCATOR_CONFIG['INDEX_TTL'],
+                 retry_after=STORE_LOCATOR_CONFIG['RETRY_AFTER']):
+        self.loader = loader
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self.lock = threading.Lock()  # guards index, loaded_at and refreshing
+        self.load_lock = threading.Lock()  # one cold-start load at a time
+        self.index = None
+        self.loaded_at = None
+        self.refreshing = False
+
+    def get(self):
+        with self.lock:
+            if self.index is not None:
+                if time.monotonic() - self.loaded_at > self.ttl and not self.refreshing:
+                    self.refreshing = True
+                    threading.Thread(target=self._refresh, name="store-index-refresh", daemon=True).start()
+                return self.index
+
+        # Nothing to serve yet: one caller loads while the others wait for it
+        with self.load_lock:
+            if self.index is None:
+                self._load()
+            return self.index
+
+    def _load(self):
+        index = StoreIndex(self.loader())
+        with self.lock:
+            if len(index):
+                self.index = index
+                self.loaded_at = time.monotonic()
+                print(f"[StoreLocator] Indexed {len(self.index)} stores")
+            elif self.index is None:
+                # Loader failed with no cache; don't cache the empty list, retry next time
+                raise RuntimeError("Store list unavailable")
+            else:
+                print("[StoreLocator] Store list came back empty, keeping the previous index")
+                self.loaded_at = time.monotonic() - self.ttl + self.retry_after
+
+    def _refresh(self):
+        try:
+            self._load()
+        except Exception as e:
+            print(f"[StoreLocator] Refresh failed: {e}")
+        finally:
+            with self.lock:
+                self.refreshing = False
+
+
+def parse_points(raw):
+    """Accept [{"latitude": .., "longitude": ..}, ...] or [[lat, lng], ...]"""
+    if not isinstance(raw, list) or not raw:
+        raise ValueError("points must be a non-empty list")
+    if len(raw) > STORE_LOCATOR_CONFIG['MAX_POINTS']:
+        raise ValueError(f"at most {STORE_LOCATOR_CONFIG['MAX_POINTS']} points per request")
+    points = np.array([
+        (point['latitude'], point['longitude']) if isinstance(point, dict) else point
+        for point in raw
+    ], dtype=float)
+    if points.ndim != 2 or points.shape[1] != 2:
+        raise ValueError("each point needs a latitude and longitude")
+    if not np.isfinite(points).all():
+        raise ValueError("latitude and longitude must be finite numbers")
+    if (np.abs(points[:, 0]) > 90).any() or (np.abs(points[:, 1]) > 180).any():
+        raise ValueError("latitude must be within [-90, 90] and longitude within [-180, 180]")
+    return points
+
+
+def bulk_nearby_stores(points, index,
+                       radius_km=STORE_LOCATOR_CONFIG['DEFAULT_RADIUS_KM'],
+                       k=STORE_LOCATOR_CONFIG['DEFAULT_K'],
+                       chunk_size=STORE_LOCATOR_CONFIG['CHUNK_SIZE']):
+    """Yield one list of results per chunk of points, in input order.
+
+    Each result holds the k nearest stores within radius_km (all k nearest if
+    radius_km is None), sorted by distance, and how many stores fall in the radius.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    k = min(k, len(index))
+
+    for start in range(0, len(points), chunk_size):
+        chunk = points[start:start + chunk_size]
+        results = []
+        if k == 0:
+            for i, (lat, lng) in enumerate(chunk):
+                results.append({'index': start + i, 'latitude': float(lat), 'longitude': float(lng),
+                                'within_radius': 0 if radius_km is not None else None, 'stores': []})
+            yield results
+            continue
+
+        # One distance matrix per chunk, then top-k without a full sort
+        distances = index.distances(chunk[:, 0], chunk[:, 1])
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+        order = np.argsort(nearest_distances, axis=1)
+        nearest = np.take_along_axis(nearest, order, axis=1)
+        nearest_distances = np.take_along_axis(nearest_distances, order, axis=1)
+        within = (distances <= radius_km).sum(axis=1) if radius_km is not None else None
+
+        for i, (lat, lng) in enumerate(chunk):
+            stores = []
+            for store_index, distance in zip(nearest[i], nearest_distances[i]):
+                if radius_km is not None and distance > radius_km:
+                    break
+                store = dict(index.stores[store_index])
+                store['distance'] = round(float(distance), 2)
+                stores.append(store)
+            results.append({
+                'index': start + i,
+                'latitude': float(lat),
+                'longitude': float(lng),
+                'within_radius': int(within[i]) if within is not None else None,
+                'stores': stores,
+            })
+        yield results
+
+
+def stream_bulk_nearby(points, index, radius_km, k):
+    """NDJSON lines (one string per chunk), ending with a throughput summary line"""
+    started = time.perf_counter()
+    for results in bulk_nearby_stores(points, index, radius_km, k):
+        yield ''.join(json.dumps(result) + '\n' for result in results)
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        'summary': {
+            'points': len(points),
+            'stores': len(index),
+            'seconds': round(elapsed, 3),
+            'points_per_second': round(len(points) / elapsed, 1) if elapsed else None,
+        }
+    }
+    print(f"[StoreLocator] {len(points)} points in {elapsed:.3f}s")
+    yield json.dumps(summary) + '\n'
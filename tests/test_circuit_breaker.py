@@ -0,0 +1,96 @@
+import asyncio
+import pytest
+from circuit_breaker import CircuitBreaker, NoProductCards, CLOSED, OPEN, HALF_OPEN
+
+
+def no_cards():
+    raise NoProductCards("no cards")
+
+
+def make_breaker(**kwargs):
+    options = {'failure_threshold': 2, 'cool_down': 60, 'slow_call_seconds': 10}
+    options.update(kwargs)
+    return CircuitBreaker('Test', **options)
+
+
+def expire_cool_down(breaker):
+    breaker.opened_at -= breaker.cool_down
+
+
+def test_quick_empty_results_are_not_failures():
+    breaker = make_breaker()
+    for _ in range(5):
+        assert breaker.call(lambda: []) == []
+    assert breaker.state == CLOSED
+    assert breaker.consecutive_failures == 0
+
+
+def test_slow_empty_result_counts_as_timeout():
+    breaker = make_breaker(slow_call_seconds=0)
+    breaker.call(lambda: [])
+    assert breaker.consecutive_timeouts == 1
+    assert breaker.last_failure == 'timeout'
+
+
+def test_opens_after_threshold_and_skips():
+    breaker = make_breaker()
+    breaker.call(no_cards)
+    assert breaker.state == CLOSED
+    breaker.call(no_cards)
+    assert breaker.state == OPEN
+    assert breaker.last_failure == 'no_cards'
+
+    calls = []
+    assert breaker.call(lambda: calls.append(1) or [1]) == []
+    assert calls == []
+    assert breaker.snapshot()['skipped'] == 1
+
+
+def test_half_open_probe_success_closes():
+    breaker = make_breaker()
+    breaker.call(no_cards)
+    breaker.call(no_cards)
+    expire_cool_down(breaker)
+
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow_request()  # only one probe at a time
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.consecutive_failures == 0
+
+
+def test_half_open_probe_failure_reopens():
+    breaker = make_breaker()
+    breaker.call(no_cards)
+    breaker.call(no_cards)
+    expire_cool_down(breaker)
+
+    assert breaker.call(lambda: 1 / 0) == []
+    assert breaker.state == OPEN
+    assert breaker.last_failure == 'error'
+    assert breaker.snapshot()['retry_in'] > 0
+
+
+def test_cancelled_probe_reopens_for_the_next_request():
+    breaker = make_breaker()
+    breaker.call(no_cards)
+    breaker.call(no_cards)
+    expire_cool_down(breaker)
+
+    async def hang():
+        await asyncio.sleep(10)
+        return [1]
+
+    async def run():
+        task = asyncio.ensure_future(breaker.call_async(hang))
+        await asyncio.sleep(0)
+        assert breaker.state == HALF_OPEN
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert breaker.state == OPEN
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
@@ -0,0 +1,70 @@
+from matching import parse_strength, parse_pack_size, canonical_key, compare_prices, group_results, ProductIndex
+
+
+def test_bare_plural_strength_is_not_a_pack():
+    assert parse_strength("Dolo 650 Tablets") == (650.0, 'mg')
+    assert parse_pack_size("Dolo 650 Tablets") is None
+    assert canonical_key("Dolo 650 Tablets") == "dolo|650mg"
+
+
+def test_trailing_count_after_dosage_form():
+    assert parse_strength("Calpol 500 Tablet 10") == (500.0, 'mg')
+    assert parse_pack_size("Calpol 500 Tablet 10") == 10
+    assert canonical_key("Calpol 500 Tablet 10") == "calpol|500mg"
+
+
+def test_strength_and_pack_variants_share_a_key():
+    assert parse_pack_size("Dolo 650 Tablet 15's") == 15
+    assert parse_pack_size("Dolo 650mg strip of 15 tablets") == 15
+    assert parse_pack_size("Dolo 650 mg") is None
+    assert canonical_key("Dolo 650 Tablet 15's") == canonical_key("Dolo 650mg Tablet")
+    assert canonical_key("Crocin 1g Tablet") == canonical_key("Crocin 1000 mg Tablet by GSK")
+
+
+def test_strip_count_is_not_a_strength():
+    assert parse_strength("Paracetamol strip of 15 tablets") is None
+    assert parse_pack_size("Paracetamol strip of 15 tablets") == 15
+
+
+def test_known_pack_offers_rank_before_pack_only_offers():
+    results = [
+        {'name': "Dolo 650 Tablet", 'price': 20, 'pharmacy': 'A', 'delivery': 0},
+        {'name': "Dolo 650 Tablet 15's", 'price': 30, 'pharmacy': 'B', 'delivery': 0},
+        {'name': "Crocin 500mg", 'price': 5, 'pharmacy': 'C', 'delivery': 0},
+    ]
+    ranked = compare_prices(results, ProductIndex())
+    assert [r['pharmacy'] for r in ranked] == ['B', 'A', 'C']
+    assert ranked[1]['unit_final_price'] is None
+
+    groups = group_results(ranked)
+    assert [g['cheapest_pharmacy'] for g in groups] == ['B', 'C']
+    assert groups[0]['best_unit_price'] == 2.0
+    assert groups[1]['best_unit_price'] is None
+
+
+def test_index_keys_are_bounded():
+    index = ProductIndex(max_size=2)
+    first, _ = index.lookup("Dolo 650mg")
+    index.lookup("Crocin 500mg")
+    index.lookup("Calpol 250mg")
+    assert len(index.keys) == 2
+    assert index.lookup("Dolo 650mg")[0] != first
+
+
+def test_concurrent_lookups_get_distinct_ids():
+    import threading
+    index = ProductIndex(max_size=50)
+    names = [f"Product{i} {i + 1}0mg" for i in range(200)]
+    ids = {}
+
+    def worker(chunk):
+        for name in chunk:
+            ids[name] = index.lookup(name)[0]
+
+    threads = [threading.Thread(target=worker, args=(names[i::4],)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(ids.values())) == len(names)
+    assert len(index.names) <= 50 and len(index.keys) <= 50
@@ -0,0 +1,128 @@
+import sqlite3
+from price_history import (
+    init_price_history, record_prices, get_price_trend, get_pharmacy_ranking,
+    compact_price_history, parse_days,
+)
+
+# medicine_prices as created before rollups existed
+LEGACY_SCHEMA = """
+CREATE TABLE medicine_prices (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    medicine_name TEXT,
+    pharmacy_name TEXT,
+    price REAL,
+    url TEXT,
+    in_stock BOOLEAN,
+    scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+# First rollup layout: no product key, pack and unit prices mixed
+OLD_ROLLUP_SCHEMA = """
+CREATE TABLE price_daily_rollup (
+    medicine_name TEXT COLLATE NOCASE NOT NULL,
+    pharmacy_name TEXT NOT NULL,
+    day DATE NOT NULL,
+    sample_count INTEGER NOT NULL,
+    price_sum REAL NOT NULL,
+    min_price REAL NOT NULL,
+    max_price REAL NOT NULL,
+    in_stock_count INTEGER NOT NULL,
+    PRIMARY KEY (medicine_name, pharmacy_name, day)
+);
+INSERT INTO price_daily_rollup VALUES ('Dolo', 'Apollo', '2025-07-15', 1, 999, 999, 999, 1);
+"""
+
+
+def offer(name, price, pharmacy, delivery, pack_size=None):
+    item = {'name': name, 'price': price, 'pharmacy': pharmacy, 'link': None,
+            'final_price': price + delivery, 'pack_size': pack_size, 'unit_final_price': None}
+    if pack_size:
+        item['unit_final_price'] = round((price + delivery) / pack_size, 2)
+    return item
+
+
+def rollup_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(
+            "SELECT product_key, basis, pharmacy_name, sample_count, price_sum, min_price, max_price "
+            "FROM price_daily_rollup ORDER BY pharmacy_name, product_key, basis"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def test_trigger_upserts_one_row_per_product_basis_and_day(tmp_path):
+    db = str(tmp_path / 'prices.db')
+    init_price_history(db)
+    record_prices('Dolo', [offer("Dolo 650 Tablet 15's", 30, 'Apollo', 15, 15)], db)
+    record_prices('dolo', [offer("Dolo 650 Tablet 15's", 60, 'Apollo', 15, 15),
+                           offer("Dolo 650 Tablet", 20, '1mg', 25)], db)
+
+    assert rollup_rows(db) == [
+        ('dolo|650mg', 'pack', '1mg', 1, 45.0, 45.0, 45.0),
+        ('dolo|650mg', 'unit', 'Apollo', 2, 8.0, 3.0, 5.0),
+    ]
+    [series] = get_price_trend('DOLO', pharmacy='Apollo', db_path=db)['Apollo']
+    assert (series['product'], series['basis']) == ('dolo|650mg', 'unit')
+    assert series['days'][0]['avg'] == 4.0
+
+    ranking = get_pharmacy_ranking('Dolo', db_path=db)
+    assert [(r['basis'], r['pharmacy']) for r in ranking] == [('unit', 'Apollo'), ('pack', '1mg')]
+
+
+def test_legacy_table_is_migrated_and_backfilled(tmp_path):
+    db = str(tmp_path / 'prices.db')
+    conn = sqlite3.connect(db)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.execute("INSERT INTO medicine_prices (medicine_name, pharmacy_name, price, in_stock, scraped_at) "
+                 "VALUES ('Dolo', 'Apollo', 30, 1, '2025-07-15 10:00:00')")
+    conn.commit()
+    conn.close()
+
+    init_price_history(db)
+    assert rollup_rows(db) == [('', 'pack', 'Apollo', 1, 30.0, 30.0, 30.0)]
+
+    # Running init again must not backfill twice
+    init_price_history(db)
+    assert len(rollup_rows(db)) == 1
+
+
+def test_old_rollups_are_rebuilt_from_raw_rows(tmp_path):
+    db = str(tmp_path / 'prices.db')
+    conn = sqlite3.connect(db)
+    conn.executescript(LEGACY_SCHEMA + OLD_ROLLUP_SCHEMA)
+    conn.execute("INSERT INTO medicine_prices (medicine_name, pharmacy_name, price, in_stock, scraped_at) "
+                 "VALUES ('Dolo', 'Apollo', 30, 1, '2025-07-15 10:00:00')")
+    conn.commit()
+    conn.close()
+
+    init_price_history(db)
+    assert rollup_rows(db) == [('', 'pack', 'Apollo', 1, 30.0, 30.0, 30.0)]
+
+
+def test_compaction_prunes_raw_rows_but_keeps_rollups(tmp_path):
+    db = str(tmp_path / 'prices.db')
+    init_price_history(db)
+    conn = sqlite3.connect(db)
+    conn.execute("INSERT INTO medicine_prices (medicine_name, pharmacy_name, price, scraped_at) "
+                 "VALUES ('Dolo', 'Apollo', 30, '2020-01-01 00:00:00')")
+    conn.commit()
+    conn.close()
+    record_prices('Dolo', [offer("Dolo 650 Tablet", 20, '1mg', 25)], db)
+
+    assert compact_price_history(90, db) == 1
+    conn = sqlite3.connect(db)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM medicine_prices").fetchone()[0] == 1
+        assert conn.execute("SELECT COUNT(*) FROM price_daily_rollup").fetchone()[0] == 2
+    finally:
+        conn.close()
+
+
+def test_parse_days_falls_back_to_default():
+    assert parse_days('7', 30) == 7
+    assert parse_days('abc', 30) == 30
+    assert parse_days(None, 30) == 30
+    assert parse_days('0', 30) == 30
@@ -0,0 +1,111 @@
+import time
+import threading
+import pytest
+from store_locator import StoreIndex, CachedStoreIndex, bulk_nearby_stores, parse_points
+
+# Roughly 0, 1.1 and 11 km north of the query point
+STORES = [
+    {'name': 'Near', 'lat': 12.9716, 'lng': 77.5946},
+    {'name': 'Mid', 'lat': 12.9816, 'lng': 77.5946},
+    {'name': 'Far', 'lat': 13.0716, 'lng': 77.5946},
+    {'name': 'No coordinates', 'lat': 0, 'lng': 0},
+]
+POINT = [(12.9716, 77.5946)]
+
+
+def nearby(points, stores=STORES, **kwargs):
+    return [result for chunk in bulk_nearby_stores(points, StoreIndex(stores), **kwargs) for result in chunk]
+
+
+def test_radius_cuts_off_far_stores():
+    [result] = nearby(POINT, radius_km=5, k=5)
+    assert [store['name'] for store in result['stores']] == ['Near', 'Mid']
+    assert result['within_radius'] == 2
+    assert result['stores'][1]['distance'] == pytest.approx(1.11, abs=0.01)
+
+
+def test_no_radius_returns_k_nearest():
+    [result] = nearby(POINT, radius_km=None, k=2)
+    assert [store['name'] for store in result['stores']] == ['Near', 'Mid']
+    assert result['within_radius'] is None
+
+
+def test_k_larger_than_store_count():
+    [result] = nearby(POINT, radius_km=None, k=50)
+    assert [store['name'] for store in result['stores']] == ['Near', 'Mid', 'Far']
+
+
+def test_empty_index_returns_empty_results():
+    results = nearby(POINT * 3, stores=[], radius_km=5, k=5)
+    assert [result['index'] for result in results] == [0, 1, 2]
+    assert all(result['stores'] == [] and result['within_radius'] == 0 for result in results)
+
+
+def test_results_keep_input_order_across_chunks():
+    points = [(12.9716, 77.5946), (13.0716, 77.5946)] * 3
+    results = [r for chunk in bulk_nearby_stores(points, StoreIndex(STORES), radius_km=None, k=1, chunk_size=4)
+               for r in chunk]
+    assert [r['index'] for r in results] == list(range(6))
+    assert [r['stores'][0]['name'] for r in results] == ['Near', 'Far'] * 3
+
+
+def test_parse_points_accepts_both_shapes():
+    points = parse_points([{'latitude': 12.9, 'longitude': 77.6}, [13.0, 77.5]])
+    assert points.tolist() == [[12.9, 77.6], [13.0, 77.5]]
+
+
+@pytest.mark.parametrize('raw', [
+    None,
+    [],
+    {'latitude': 1, 'longitude': 2},
+    [[1, 2, 3]],
+    [[float('nan'), 77.0]],
+    [[91, 77.0]],
+    [[12.0, -181]],
+])
+def test_parse_points_rejects_bad_input(raw):
+    with pytest.raises(ValueError):
+        parse_points(raw)
+
+
+def test_cached_index_is_not_cached_when_empty():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return [] if len(calls) == 1 else STORES
+
+    cached = CachedStoreIndex(loader, ttl=3600)
+    with pytest.raises(RuntimeError):
+        cached.get()
+    assert len(cached.get()) == 3
+    assert len(calls) == 2
+
+
+def test_expired_index_is_served_while_refreshing():
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        if len(calls) > 1:
+            release.wait(5)
+        return STORES[:len(calls)]
+
+    cached = CachedStoreIndex(loader, ttl=0)
+    first = cached.get()
+    time.sleep(0.01)
+
+    # The refresh is blocked in the loader, yet callers get the stale index immediately
+    assert cached.get() is first
+    deadline = time.monotonic() + 5
+    while len(calls) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cached.get() is first
+    assert len(calls) == 2  # only one refresh in flight
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while cached.refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(cached.index) == 2